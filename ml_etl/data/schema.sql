@@ -107,6 +107,8 @@ CREATE TABLE IF NOT EXISTS PredictionOutcomes (
     CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS idx_prediction_outcomes_prediction ON PredictionOutcomes(PredictionID);
+
 -- Retraining decisions
 CREATE TABLE IF NOT EXISTS RetrainingDecisions (
     DecisionID TEXT PRIMARY KEY,
@@ -121,8 +123,12 @@ CREATE TABLE IF NOT EXISTS RetrainingDecisions (
     PerformanceMetricID TEXT,  -- Reference to ModelPerformance
     DriftMetricID TEXT,  -- Reference to FeatureDrift
     DecisionMadeBy TEXT,  -- 'automatic' or 'manual'
+    DecisionEpoch INTEGER,  -- DecisionDate as Unix epoch seconds
     CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (ModelID) REFERENCES MLModels(ModelID),
     FOREIGN KEY (PerformanceMetricID) REFERENCES ModelPerformance(PerformanceID),
     FOREIGN KEY (DriftMetricID) REFERENCES FeatureDrift(DriftID)
-);
\ No newline at end of file
+);
+
+-- The latest-decision index on RetrainingDecisions(DecisionEpoch) is created by
+-- migrate_offline_db (src/offline_db.py) after the column is known to exist
\ No newline at end of file
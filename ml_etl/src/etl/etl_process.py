@@ -8,15 +8,20 @@ database for ML model training and monitoring.
 """
 
 import os
+import sys
 import uuid
 import logging
 import sqlite3
-import json
-import random
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Iterable, Iterator
+
+# Shared offline database helpers live in src/, one level above this script
+_SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _SRC_DIR not in sys.path:
+    sys.path.insert(0, _SRC_DIR)
+from offline_db import migrate_offline_db
 
 # Configure logging
 logging.basicConfig(
@@ -60,10 +65,263 @@ JOIN
     TaxProcessingEvents tpe2 ON tpe1.TaxFileID = tpe2.TaxFileID AND tpe1.NewStatus = tpe2.OldStatus
 JOIN 
     TaxFiles tf ON tpe1.TaxFileID = tf.TaxFileID
-ORDER BY 
-    tpe1.TaxFileID, tpe1.StatusUpdateDate
 """
 
+# Rows per chunk when streaming the extract query; bounds peak memory of the ETL
+EXTRACT_CHUNK_SIZE = int(os.environ.get('ETL_CHUNK_SIZE', '100000'))
+
+# Columns written to the offline tables, in insert order
+TRAINING_DATA_COLUMNS = (
+    'RecordID', 'TaxFileID', 'FilingType', 'TaxYear', 'TaxCategories', 'DeductionCategories',
+    'ClaimedRefundAmount', 'GeographicRegion', 'ProcessingCenter', 'FilingPeriod',
+    'SourceStatus', 'TargetStatus', 'ActualTransitionDays', 'DataPartition', 'ETLJobID', 'CreatedAt'
+)
+
+PREDICTION_OUTCOME_COLUMNS = (
+    'OutcomeID', 'PredictionID', 'TaxFileID', 'ConfidenceScore', 'ModelVersion',
+    'PredictedAvailabilityDate', 'PredictedTransitionDays', 'ActualTransitionDays',
+    'ErrorDays', 'InputFeatures', 'CreatedAt'
+)
+
+# Nanoseconds per day, for transition durations computed on int64 timestamps
+NS_PER_DAY = 86400 * 1_000_000_000
+
+# Upper bin edges (inclusive) and labels for filing periods
+FILING_PERIOD_EDGES = np.array([2, 4])
+FILING_PERIOD_LABELS = ['Early', 'Mid', 'Late']
+
+# Low-cardinality string columns held as pandas categoricals after extract
+CATEGORICAL_COLUMNS = ('FilingType', 'GeographicRegion', 'ProcessingCenter', 'SourceStatus', 'TargetStatus')
+
+# Segment keys shared by the statistics window and GROUP BY clauses
+_SEGMENT_KEYS = """SourceStatus, TargetStatus, FilingType, TaxYear,
+        GeographicRegion, ProcessingCenter, FilingPeriod, RefundAmountBucket"""
+
+# Builds TransitionStatistics entirely inside SQLite, reading the online database
+# attached as `online`. Filing period and refund bucket mirror the bins used in
+# transform_data, and transitions with a missing grouping key are skipped.
+# Percentiles interpolate linearly between the ranks around (n - 1) * q, as
+# np.percentile does; whole-day statistics are truncated to integers.
+TRANSITION_STATISTICS_INSERT = f"""
+INSERT INTO TransitionStatistics (
+    StatID, SegmentKey, FilingType, TaxYear, GeographicRegion, ProcessingCenter,
+    FilingPeriod, SourceStatus, TargetStatus, RefundAmountBucket,
+    AvgTransitionDays, MedianTransitionDays, P25TransitionDays, P75TransitionDays,
+    MinTransitionDays, MaxTransitionDays, SampleSize, SuccessRate,
+    ComputationDate, ETLJobID, CreatedAt
+)
+WITH Transitions AS (
+    SELECT 
+        tpe1.OldStatus as SourceStatus,
+        tpe1.NewStatus as TargetStatus,
+        tf.FilingType,
+        tf.TaxYear,
+        tf.GeographicRegion,
+        tpe1.ProcessingCenter,
+        CASE
+            WHEN CAST(strftime('%m', tpe1.StatusUpdateDate) AS INTEGER) BETWEEN 1 AND 2 THEN 'Early'
+            WHEN CAST(strftime('%m', tpe1.StatusUpdateDate) AS INTEGER) BETWEEN 3 AND 4 THEN 'Mid'
+            WHEN CAST(strftime('%m', tpe1.StatusUpdateDate) AS INTEGER) BETWEEN 5 AND 12 THEN 'Late'
+        END as FilingPeriod,
+        CASE
+            WHEN tf.ClaimedRefundAmount > 0 AND tf.ClaimedRefundAmount <= 1000 THEN '0-1000'
+            WHEN tf.ClaimedRefundAmount > 1000 AND tf.ClaimedRefundAmount <= 3000 THEN '1000-3000'
+            WHEN tf.ClaimedRefundAmount > 3000 AND tf.ClaimedRefundAmount <= 5000 THEN '3000-5000'
+            WHEN tf.ClaimedRefundAmount > 5000 THEN '5000+'
+        END as RefundAmountBucket,
+        (strftime('%s', tpe2.StatusUpdateDate) - strftime('%s', tpe1.StatusUpdateDate)) / 86400.0 as TransitionDays
+    FROM 
+        online.TaxProcessingEvents tpe1
+    JOIN 
+        online.TaxProcessingEvents tpe2 ON tpe1.TaxFileID = tpe2.TaxFileID AND tpe1.NewStatus = tpe2.OldStatus
+    JOIN 
+        online.TaxFiles tf ON tpe1.TaxFileID = tf.TaxFileID
+),
+Ranked AS (
+    SELECT 
+        *,
+        ROW_NUMBER() OVER (segment ORDER BY TransitionDays) - 1 as RankIdx,
+        COUNT(*) OVER segment as GroupSize
+    FROM 
+        Transitions
+    WHERE 
+        SourceStatus IS NOT NULL AND TargetStatus IS NOT NULL AND FilingType IS NOT NULL
+        AND TaxYear IS NOT NULL AND GeographicRegion IS NOT NULL AND ProcessingCenter IS NOT NULL
+        AND FilingPeriod IS NOT NULL AND RefundAmountBucket IS NOT NULL
+        AND TransitionDays IS NOT NULL
+    WINDOW segment AS (PARTITION BY {_SEGMENT_KEYS})
+),
+Bounds AS (
+    SELECT 
+        *,
+        MAX(CASE WHEN RankIdx = CAST((GroupSize - 1) * 0.25 AS INTEGER) THEN TransitionDays END) OVER segment as P25Lo,
+        MAX(CASE WHEN RankIdx = CAST((GroupSize - 1) * 0.25 AS INTEGER) + 1 THEN TransitionDays END) OVER segment as P25Hi,
+        MAX(CASE WHEN RankIdx = CAST((GroupSize - 1) * 0.5 AS INTEGER) THEN TransitionDays END) OVER segment as P50Lo,
+        MAX(CASE WHEN RankIdx = CAST((GroupSize - 1) * 0.5 AS INTEGER) + 1 THEN TransitionDays END) OVER segment as P50Hi,
+        MAX(CASE WHEN RankIdx = CAST((GroupSize - 1) * 0.75 AS INTEGER) THEN TransitionDays END) OVER segment as P75Lo,
+        MAX(CASE WHEN RankIdx = CAST((GroupSize - 1) * 0.75 AS INTEGER) + 1 THEN TransitionDays END) OVER segment as P75Hi
+    FROM 
+        Ranked
+    WINDOW segment AS (PARTITION BY {_SEGMENT_KEYS})
+),
+Percentiles AS (
+    SELECT 
+        *,
+        P25Lo + ((GroupSize - 1) * 0.25 - CAST((GroupSize - 1) * 0.25 AS INTEGER)) * (COALESCE(P25Hi, P25Lo) - P25Lo) as P25,
+        P50Lo + ((GroupSize - 1) * 0.5 - CAST((GroupSize - 1) * 0.5 AS INTEGER)) * (COALESCE(P50Hi, P50Lo) - P50Lo) as P50,
+        P75Lo + ((GroupSize - 1) * 0.75 - CAST((GroupSize - 1) * 0.75 AS INTEGER)) * (COALESCE(P75Hi, P75Lo) - P75Lo) as P75
+    FROM 
+        Bounds
+)
+SELECT 
+    'stat-' || lower(hex(randomblob(16))),
+    SourceStatus || '-' || TargetStatus || '-' || FilingType || '-' || GeographicRegion || '-' || FilingPeriod,
+    FilingType, TaxYear, GeographicRegion, ProcessingCenter,
+    FilingPeriod, SourceStatus, TargetStatus, RefundAmountBucket,
+    AVG(TransitionDays),
+    CAST(MAX(P50) AS INTEGER),
+    CAST(MAX(P25) AS INTEGER),
+    CAST(MAX(P75) AS INTEGER),
+    CAST(MIN(TransitionDays) AS INTEGER),
+    CAST(MAX(TransitionDays) AS INTEGER),
+    COUNT(*),
+    -- Success rate: share of transitions completed within the segment's 75th percentile
+    AVG(TransitionDays <= P75),
+    :computation_date, :etl_job_id, :created_at
+FROM 
+    Percentiles
+GROUP BY 
+    {_SEGMENT_KEYS}
+"""
+
+# Fallback DDL for the offline tables, used when the schema file is missing
+OFFLINE_TABLE_DDL = {
+    'TrainingData': '''
+    CREATE TABLE IF NOT EXISTS TrainingData (
+        RecordID TEXT PRIMARY KEY,
+        TaxFileID TEXT,
+        FilingType TEXT,
+        TaxYear INTEGER,
+        TaxCategories TEXT,
+        DeductionCategories TEXT,
+        ClaimedRefundAmount DECIMAL,
+        GeographicRegion TEXT,
+        ProcessingCenter TEXT,
+        FilingPeriod TEXT,
+        SourceStatus TEXT,
+        TargetStatus TEXT,
+        ActualTransitionDays INTEGER,
+        DataPartition TEXT,
+        ETLJobID TEXT,
+        CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    'TransitionStatistics': '''
+    CREATE TABLE IF NOT EXISTS TransitionStatistics (
+        StatID TEXT PRIMARY KEY,
+        SegmentKey TEXT,
+        FilingType TEXT,
+        TaxYear INTEGER,
+        GeographicRegion TEXT,
+        ProcessingCenter TEXT,
+        FilingPeriod TEXT,
+        SourceStatus TEXT,
+        TargetStatus TEXT,
+        RefundAmountBucket TEXT,
+        AvgTransitionDays DECIMAL,
+        MedianTransitionDays INTEGER,
+        P25TransitionDays INTEGER,
+        P75TransitionDays INTEGER,
+        MinTransitionDays INTEGER,
+        MaxTransitionDays INTEGER,
+        SampleSize INTEGER,
+        SuccessRate DECIMAL,
+        ComputationDate TIMESTAMP,
+        ETLJobID TEXT,
+        CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    'MLModels': '''
+    CREATE TABLE IF NOT EXISTS MLModels (
+        ModelID TEXT PRIMARY KEY,
+        ModelVersion TEXT,
+        Algorithm TEXT,
+        Hyperparameters TEXT,
+        FeatureList TEXT,
+        TrainingDataSize INTEGER,
+        TrainingStartDate TIMESTAMP,
+        TrainingEndDate TIMESTAMP,
+        CreatedBy TEXT,
+        IsActive BOOLEAN,
+        CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    'ModelPerformance': '''
+    CREATE TABLE IF NOT EXISTS ModelPerformance (
+        PerformanceID TEXT PRIMARY KEY,
+        ModelID TEXT,
+        EvaluationDate TIMESTAMP,
+        DataPartition TEXT,
+        EvaluationPeriod TEXT,
+        SampleSize INTEGER,
+        MeanAbsoluteErrorDays DECIMAL,
+        AccuracyWithin7Days DECIMAL,
+        ConfidenceScoreCorrelation DECIMAL,
+        CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (ModelID) REFERENCES MLModels(ModelID)
+    )
+    ''',
+    'FeatureDrift': '''
+    CREATE TABLE IF NOT EXISTS FeatureDrift (
+        DriftID TEXT PRIMARY KEY,
+        ModelID TEXT,
+        DetectionDate TIMESTAMP,
+        FeatureDriftScore DECIMAL,
+        DriftDetected BOOLEAN,
+        SignificantFeatures TEXT,
+        SampleSize INTEGER,
+        BaselineStartDate TIMESTAMP,
+        BaselineEndDate TIMESTAMP,
+        CurrentStartDate TIMESTAMP,
+        CurrentEndDate TIMESTAMP,
+        CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (ModelID) REFERENCES MLModels(ModelID)
+    )
+    ''',
+    'RetrainingDecisions': '''
+    CREATE TABLE IF NOT EXISTS RetrainingDecisions (
+        DecisionID TEXT PRIMARY KEY,
+        ModelID TEXT,
+        DecisionDate TIMESTAMP,
+        ScheduleBasedRetraining BOOLEAN,
+        PerformanceBasedRetraining BOOLEAN,
+        DriftBasedRetraining BOOLEAN,
+        RetrainingRecommended BOOLEAN,
+        RecommendationReason TEXT,
+        LastTrainingDate TIMESTAMP,
+        PerformanceMetricID TEXT,
+        DriftMetricID TEXT,
+        DecisionMadeBy TEXT,
+        DecisionEpoch INTEGER,
+        CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (ModelID) REFERENCES MLModels(ModelID),
+        FOREIGN KEY (PerformanceMetricID) REFERENCES ModelPerformance(PerformanceID),
+        FOREIGN KEY (DriftMetricID) REFERENCES FeatureDrift(DriftID)
+    )
+    ''',
+}
+
+def _uuid_col(prefix: str, n: int) -> List[str]:
+    """Generate n prefixed UUID4 strings from a single urandom read."""
+    raw = os.urandom(16 * n)
+    return [f'{prefix}-{uuid.UUID(bytes=raw[i * 16:(i + 1) * 16], version=4)}' for i in range(n)]
+
+def _tune_read_connection(conn: sqlite3.Connection, schema: str = 'main') -> None:
+    """Enable memory-mapped I/O and a larger page cache for the event self-join."""
+    conn.execute(f'PRAGMA {schema}.mmap_size=30000000000')
+    conn.execute(f'PRAGMA {schema}.cache_size=-262144')  # 256 MB
+    conn.execute('PRAGMA temp_store=MEMORY')
+
 def create_offline_db() -> None:
     """Create the offline database schema if it doesn't exist."""
     logger.info("Setting up offline database...")
@@ -81,361 +339,270 @@ def create_offline_db() -> None:
     # Connect to database (creates it if it doesn't exist)
     conn = sqlite3.connect(OFFLINE_DB_PATH)
     
-    # Check if schema file exists
-    if os.path.exists(SCHEMA_PATH):
-        logger.info(f"Applying schema from {SCHEMA_PATH}")
-        with open(SCHEMA_PATH, 'r') as f:
-            schema_sql = f.read()
-            conn.executescript(schema_sql)
-    else:
-        logger.warning(f"Schema file not found at {SCHEMA_PATH}. Creating tables manually.")
-        # Create tables manually if schema file doesn't exist
-        cursor = conn.cursor()
-        
-        # Create TrainingData table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS TrainingData (
-            RecordID TEXT PRIMARY KEY,
-            TaxFileID TEXT,
-            FilingType TEXT,
-            TaxYear INTEGER,
-            TaxCategories TEXT,
-            DeductionCategories TEXT,
-            ClaimedRefundAmount DECIMAL,
-            GeographicRegion TEXT,
-            ProcessingCenter TEXT,
-            FilingPeriod TEXT,
-            SourceStatus TEXT,
-            TargetStatus TEXT,
-            ActualTransitionDays INTEGER,
-            DataPartition TEXT,
-            ETLJobID TEXT,
-            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create TransitionStatistics table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS TransitionStatistics (
-            StatID TEXT PRIMARY KEY,
-            SegmentKey TEXT,
-            FilingType TEXT,
-            TaxYear INTEGER,
-            GeographicRegion TEXT,
-            ProcessingCenter TEXT,
-            FilingPeriod TEXT,
-            SourceStatus TEXT,
-            TargetStatus TEXT,
-            AvgTransitionDays DECIMAL,
-            MedianTransitionDays INTEGER,
-            P25TransitionDays INTEGER,
-            P75TransitionDays INTEGER,
-            MinTransitionDays INTEGER,
-            MaxTransitionDays INTEGER,
-            SampleSize INTEGER,
-            SuccessRate DECIMAL,
-            ComputationDate TIMESTAMP,
-            ETLJobID TEXT,
-            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # No legacy tables needed
-        
-        # Create MLModels table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS MLModels (
-            ModelID TEXT PRIMARY KEY,
-            ModelVersion TEXT,
-            Algorithm TEXT,
-            Hyperparameters TEXT,
-            FeatureList TEXT,
-            TrainingDataSize INTEGER,
-            TrainingStartDate TIMESTAMP,
-            TrainingEndDate TIMESTAMP,
-            CreatedBy TEXT,
-            IsActive BOOLEAN,
-            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+    try:
+        # Look up existing tables once and skip the DDL entirely when nothing is missing
+        existing_tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        missing_tables = [name for name in OFFLINE_TABLE_DDL if name not in existing_tables]
         
-        # Create ModelPerformance table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ModelPerformance (
-            PerformanceID TEXT PRIMARY KEY,
-            ModelID TEXT,
-            EvaluationDate TIMESTAMP,
-            DataPartition TEXT,
-            EvaluationPeriod TEXT,
-            SampleSize INTEGER,
-            MeanAbsoluteErrorDays DECIMAL,
-            AccuracyWithin7Days DECIMAL,
-            ConfidenceScoreCorrelation DECIMAL,
-            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (ModelID) REFERENCES MLModels(ModelID)
-        )
-        ''')
+        if not missing_tables:
+            logger.info("Offline database schema is already in place")
+        elif os.path.exists(SCHEMA_PATH):
+            logger.info(f"Applying schema from {SCHEMA_PATH}")
+            with open(SCHEMA_PATH, 'r') as f:
+                schema_sql = f.read()
+            conn.executescript(f"BEGIN;\n{schema_sql}\nCOMMIT;")
+        else:
+            logger.warning(f"Schema file not found at {SCHEMA_PATH}. Creating tables manually.")
+            # Create the missing tables manually in a single transaction
+            ddl = ";\n".join(OFFLINE_TABLE_DDL[name] for name in missing_tables)
+            conn.executescript(f"BEGIN;\n{ddl};\nCOMMIT;")
         
-        # Create FeatureDrift table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS FeatureDrift (
-            DriftID TEXT PRIMARY KEY,
-            ModelID TEXT,
-            DetectionDate TIMESTAMP,
-            FeatureDriftScore DECIMAL,
-            DriftDetected BOOLEAN,
-            SignificantFeatures TEXT,
-            SampleSize INTEGER,
-            BaselineStartDate TIMESTAMP,
-            BaselineEndDate TIMESTAMP,
-            CurrentStartDate TIMESTAMP,
-            CurrentEndDate TIMESTAMP,
-            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (ModelID) REFERENCES MLModels(ModelID)
-        )
-        ''')
+        migrate_offline_db(conn)
         
-        # Create RetrainingDecisions table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS RetrainingDecisions (
-            DecisionID TEXT PRIMARY KEY,
-            ModelID TEXT,
-            DecisionDate TIMESTAMP,
-            ScheduleBasedRetraining BOOLEAN,
-            PerformanceBasedRetraining BOOLEAN,
-            DriftBasedRetraining BOOLEAN,
-            RetrainingRecommended BOOLEAN,
-            RecommendationReason TEXT,
-            LastTrainingDate TIMESTAMP,
-            PerformanceMetricID TEXT,
-            DriftMetricID TEXT,
-            DecisionMadeBy TEXT,
-            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (ModelID) REFERENCES MLModels(ModelID),
-            FOREIGN KEY (PerformanceMetricID) REFERENCES ModelPerformance(PerformanceID),
-            FOREIGN KEY (DriftMetricID) REFERENCES FeatureDrift(DriftID)
-        )
-        ''')
+        conn.commit()
+    except Exception:
+        # A failed executescript leaves its BEGIN open
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
     
-    conn.commit()
-    conn.close()
     logger.info("Offline database setup completed successfully")
 
-def extract_data() -> pd.DataFrame:
-    """Extract data from the online database."""
+def extract_data() -> Iterator[pd.DataFrame]:
+    """Extract data from the online database in chunks of EXTRACT_CHUNK_SIZE rows."""
     logger.info("Extracting data from online database")
     
     # Check if online database exists
     if not os.path.exists(ONLINE_DB_PATH):
         logger.error(f"Online database not found at {ONLINE_DB_PATH}")
         logger.error("Please run the service init-db script first to create the online database")
-        return pd.DataFrame()  # Return empty DataFrame
+        return  # No chunks
     
+    conn = sqlite3.connect(ONLINE_DB_PATH)
+    _tune_read_connection(conn)
+    total_rows = 0
     try:
-        conn = sqlite3.connect(ONLINE_DB_PATH)
-        df = pd.read_sql_query(EXTRACT_EVENTS_QUERY, conn)
-        conn.close()
-        
-        logger.info(f"Extracted {len(df)} records from online database")
-        return df
+        for df in pd.read_sql_query(EXTRACT_EVENTS_QUERY, conn, chunksize=EXTRACT_CHUNK_SIZE):
+            # Low-cardinality string columns are stored as categoricals
+            for col in CATEGORICAL_COLUMNS:
+                df[col] = df[col].astype('category')
+            
+            total_rows += len(df)
+            yield df
     except Exception as e:
         logger.error(f"Error extracting data from online database: {str(e)}")
-        return pd.DataFrame()  # Return empty DataFrame on error
+        raise
+    finally:
+        conn.close()
+    
+    logger.info(f"Extracted {total_rows} records from online database")
 
-def transform_data(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """Transform the data into training data and aggregated statistics."""
+def transform_data(df: pd.DataFrame, etl_job_id: str, run_timestamp: str) -> pd.DataFrame:
+    """Transform the extracted transitions into training data.
+    
+    Aggregated transition statistics are built in SQLite by load_data
+    and do not go through pandas.
+    """
     logger.info("Transforming data")
     
     if df.empty:
         logger.warning("No data to transform")
-        return pd.DataFrame(), pd.DataFrame()
+        return pd.DataFrame()
     
     # Calculate transition days
-    df['SourceDate'] = pd.to_datetime(df['SourceDate'])
-    df['TargetDate'] = pd.to_datetime(df['TargetDate'])
-    df['TransitionDays'] = (df['TargetDate'] - df['SourceDate']).dt.total_seconds() / (24 * 3600)
-    
-    # Create refund amount buckets
-    df['RefundAmountBucket'] = pd.cut(
-        df['ClaimedRefundAmount'],
-        bins=[0, 1000, 3000, 5000, float('inf')],
-        labels=['0-1000', '1000-3000', '3000-5000', '5000+']
-    )
-    
-    # Determine filing period (Early, Mid, Late)
-    df['FilingMonth'] = df['SourceDate'].dt.month
-    df['FilingPeriod'] = pd.cut(
-        df['FilingMonth'],
-        bins=[0, 2, 4, 12],
-        labels=['Early', 'Mid', 'Late']
-    )
-    
-    # Parse JSON columns
-    df['TaxCategories'] = df['TaxCategories'].apply(lambda x: json.loads(x) if x else {})
-    df['DeductionCategories'] = df['DeductionCategories'].apply(lambda x: json.loads(x) if x else {})
-    
-    # Create ETL job ID
-    etl_job_id = str(uuid.uuid4())
-    
-    # 1. Prepare training data
-    training_data = df.copy()
-    
-    # Convert JSON columns back to strings for storage
-    training_data['TaxCategories'] = training_data['TaxCategories'].apply(json.dumps)
-    training_data['DeductionCategories'] = training_data['DeductionCategories'].apply(json.dumps)
-    
-    # Add additional columns
-    # Use UUIDs for RecordIDs to ensure uniqueness across ETL runs
-    training_data['RecordID'] = [f'record-{uuid.uuid4()}' for _ in range(len(training_data))]
-    training_data['ActualTransitionDays'] = training_data['TransitionDays'].astype(int)
-    
-    # Assign data partitions (80% training, 10% validation, 10% test)
-    partitions = ['training'] * 80 + ['validation'] * 10 + ['test'] * 10
-    random.shuffle(partitions)
-    training_data['DataPartition'] = [partitions[i % len(partitions)] for i in range(len(training_data))]
-    
-    training_data['ETLJobID'] = etl_job_id
-    training_data['CreatedAt'] = datetime.now().isoformat()
-    
-    # Select columns for TrainingData table
-    training_data = training_data[[
-        'RecordID', 'TaxFileID', 'FilingType', 'TaxYear', 'TaxCategories', 'DeductionCategories',
-        'ClaimedRefundAmount', 'GeographicRegion', 'ProcessingCenter', 'FilingPeriod',
-        'SourceStatus', 'TargetStatus', 'ActualTransitionDays', 'DataPartition', 'ETLJobID', 'CreatedAt'
-    ]]
-    
-    # 2. Prepare aggregated statistics
-    # Group by relevant dimensions
-    groupby_cols = [
-        'SourceStatus', 'TargetStatus', 'FilingType', 'TaxYear',
-        'GeographicRegion', 'ProcessingCenter', 'FilingPeriod', 'RefundAmountBucket'
-    ]
-    
-    # Calculate statistics
-    stats_df = df.groupby(groupby_cols).agg(
-        AvgTransitionDays=('TransitionDays', 'mean'),
-        MedianTransitionDays=('TransitionDays', lambda x: int(np.median(x))),
-        P25TransitionDays=('TransitionDays', lambda x: int(np.percentile(x, 25))),
-        P75TransitionDays=('TransitionDays', lambda x: int(np.percentile(x, 75))),
-        MinTransitionDays=('TransitionDays', lambda x: int(np.min(x))),
-        MaxTransitionDays=('TransitionDays', lambda x: int(np.max(x))),
-        SampleSize=('TransitionDays', 'count'),
-    ).reset_index()
-    
-    # Calculate success rate (percentage of transitions completed within expected time)
-    # For this example, we'll use a simple heuristic: transitions completed within the 75th percentile
-    success_rates = {}
-    for name, group in df.groupby(groupby_cols):
-        success_rates[name] = (group['TransitionDays'] <= np.percentile(group['TransitionDays'], 75)).mean()
-    
-    # Assign a default success rate
-    stats_df['SuccessRate'] = 0.75
-    
-    # Update success rates for each row based on its group
-    for i, row in stats_df.iterrows():
-        group_key = tuple(row[col] for col in groupby_cols)
-        if group_key in success_rates:
-            stats_df.at[i, 'SuccessRate'] = success_rates[group_key]
-    
-    # Create segment key (composite key for grouping)
-    stats_df['SegmentKey'] = stats_df.apply(
-        lambda row: f"{row['SourceStatus']}-{row['TargetStatus']}-{row['FilingType']}-{row['GeographicRegion']}-{row['FilingPeriod']}",
-        axis=1
+    # Status dates are ISO 8601 strings; an explicit format skips per-row format inference
+    df['SourceDate'] = pd.to_datetime(df['SourceDate'], format='ISO8601', cache=True)
+    df['TargetDate'] = pd.to_datetime(df['TargetDate'], format='ISO8601', cache=True)
+    
+    # Transitions without both timestamps have no duration
+    missing_dates = df['SourceDate'].isna() | df['TargetDate'].isna()
+    if missing_dates.any():
+        logger.warning(f"Dropping {missing_dates.sum()} transitions with missing status dates")
+        df = df[~missing_dates].copy()
+    
+    # Work on int64 nanoseconds instead of going through total_seconds()
+    delta_ns = (
+        df['TargetDate'].to_numpy('datetime64[ns]').view('i8') -
+        df['SourceDate'].to_numpy('datetime64[ns]').view('i8')
     )
     
-    # Add metadata
-    now = datetime.now()
-    stats_df['ComputationDate'] = now.isoformat()
-    stats_df['ETLJobID'] = etl_job_id
-    stats_df['CreatedAt'] = now.isoformat()
-    # Use UUIDs for StatIDs to ensure uniqueness across ETL runs
-    stats_df['StatID'] = [f'stat-{uuid.uuid4()}' for _ in range(len(stats_df))]
-    
-    logger.info(f"Transformed data into {len(training_data)} training records and {len(stats_df)} aggregated statistics")
-    return training_data, stats_df
+    # Determine filing period (Early: Jan-Feb, Mid: Mar-Apr, Late: May-Dec)
+    period_codes = np.searchsorted(FILING_PERIOD_EDGES, df['SourceDate'].dt.month.to_numpy(), side='left')
+    df['FilingPeriod'] = pd.Categorical.from_codes(period_codes, FILING_PERIOD_LABELS, ordered=True)
+    
+    # JSON columns are stored as-is; missing or empty values become an empty object
+    json_cols = ['TaxCategories', 'DeductionCategories']
+    df[json_cols] = df[json_cols].fillna('{}').replace('', '{}')
+    
+    # Assign data partitions at random (80% training, 10% validation, 10% test)
+    partitions = pd.Categorical(np.random.choice(
+        np.array(['training', 'validation', 'test']),
+        size=len(df),
+        p=[0.8, 0.1, 0.1]
+    ))
+    
+    # Build the output from the needed source columns only, rather than copying the frame
+    source_cols = [col for col in TRAINING_DATA_COLUMNS if col in df.columns]
+    training_data = df[source_cols].assign(
+        # Use UUIDs for RecordIDs to ensure uniqueness across ETL runs
+        RecordID=_uuid_col('record', len(df)),
+        # Whole days truncated toward zero, computed without the float step
+        ActualTransitionDays=(np.sign(delta_ns) * (np.abs(delta_ns) // NS_PER_DAY)).astype(np.int32),
+        # Narrowest integer type for the year (left as float if any year is missing)
+        TaxYear=pd.to_numeric(df['TaxYear'], downcast='integer'),
+        DataPartition=partitions,
+        ETLJobID=etl_job_id,
+        CreatedAt=run_timestamp,
+    )[list(TRAINING_DATA_COLUMNS)]
+    
+    logger.info(f"Transformed data into {len(training_data)} training records")
+    return training_data
+
+def _insert_rows(conn: sqlite3.Connection, table: str, columns: Tuple[str, ...], df: pd.DataFrame, or_ignore: bool = False) -> None:
+    """Insert the given DataFrame columns into a table with a single executemany."""
+    # Box to Python objects and map missing values to None so sqlite3 can bind every cell
+    values = df[list(columns)].astype(object)
+    values = values.where(values.notna(), None)
+    verb = "INSERT OR IGNORE" if or_ignore else "INSERT"
+    sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    conn.executemany(sql, values.itertuples(index=False, name=None))
 
-def load_data(training_data: pd.DataFrame, stats_df: pd.DataFrame) -> None:
-    """Load the transformed data into the offline database."""
+def load_data(training_chunks: Iterable[pd.DataFrame], etl_job_id: str, run_timestamp: str) -> None:
+    """Load the training data and transition statistics into the offline database."""
     logger.info("Loading data into offline database")
     
-    if (training_data is None or training_data.empty) and (stats_df is None or stats_df.empty):
-        logger.warning("No data to load")
-        return
-    
     conn = sqlite3.connect(OFFLINE_DB_PATH)
     
-    # Load training data
-    if not training_data.empty:
+    # Bulk-load tuning: WAL journal, relaxed fsync, in-memory temp storage
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    
+    try:
+        # The online database is attached so statistics are built with INSERT ... SELECT
+        # (ATTACH would otherwise create an empty file when the online database is missing)
+        online_available = os.path.exists(ONLINE_DB_PATH)
+        if online_available:
+            conn.execute("ATTACH DATABASE ? AS online", (ONLINE_DB_PATH,))
+            _tune_read_connection(conn, 'online')
+        
+        # Load training data
         # Clear existing data (optional - you might want to keep historical data)
         # conn.execute("DELETE FROM TrainingData")
         
-        # Insert new data
-        training_data.to_sql('TrainingData', conn, if_exists='append', index=False)
-        logger.info(f"Loaded {len(training_data)} records into TrainingData table")
-    
-    # Load aggregated statistics
-    if not stats_df.empty:
-        # Clear existing data
-        # conn.execute("DELETE FROM TransitionStatistics")
+        # Insert each chunk as it arrives so only one chunk is held in memory at a time
+        loaded_rows = 0
+        for training_data in training_chunks:
+            if training_data.empty:
+                continue
+            _insert_rows(conn, 'TrainingData', TRAINING_DATA_COLUMNS, training_data)
+            loaded_rows += len(training_data)
         
-        # Insert new data
-        stats_df.to_sql('TransitionStatistics', conn, if_exists='append', index=False)
-        logger.info(f"Loaded {len(stats_df)} records into TransitionStatistics table")
-    
-    conn.commit()
-    conn.close()
+        if loaded_rows:
+            logger.info(f"Loaded {loaded_rows} records into TrainingData table")
+        else:
+            logger.warning("No training data to load")
+        
+        # Load aggregated statistics
+        if online_available:
+            # Clear existing data
+            # conn.execute("DELETE FROM TransitionStatistics")
+            cursor = conn.execute(TRANSITION_STATISTICS_INSERT, {
+                'computation_date': run_timestamp,
+                'etl_job_id': etl_job_id,
+                'created_at': run_timestamp
+            })
+            logger.info(f"Loaded {cursor.rowcount} records into TransitionStatistics table")
+        else:
+            logger.warning("Online database not available, skipping transition statistics")
+        
+        # Both tables are written in one transaction
+        conn.commit()
+    except Exception:
+        # An error here, including one raised mid-stream by the extract generator,
+        # discards the partially loaded chunks so the run leaves no half-written data
+        conn.rollback()
+        raise
+    finally:
+        # Closing the connection also detaches the online database
+        conn.close()
     
     logger.info("Data loading completed successfully")
 
-def extract_prediction_outcomes() -> pd.DataFrame:
-    """Extract prediction outcomes from the online database."""
+def extract_prediction_outcomes() -> Iterator[pd.DataFrame]:
+    """Extract prediction outcomes from the online database in chunks of EXTRACT_CHUNK_SIZE rows."""
     logger.info("Extracting prediction outcomes from online database")
     
     # Check if online database exists
     if not os.path.exists(ONLINE_DB_PATH):
         logger.error(f"Online database not found at {ONLINE_DB_PATH}")
-        return pd.DataFrame()  # Return empty DataFrame
+        return  # No chunks
     
+    conn = sqlite3.connect(ONLINE_DB_PATH)
+    total_rows = 0
     try:
-        conn = sqlite3.connect(ONLINE_DB_PATH)
-        
         # Calculate cutoff date (last 30 days)
         cutoff_date = (datetime.now() - timedelta(days=30)).isoformat()
         
-        # Query to get predictions with outcomes
+        # Query to get predictions with outcomes: for each recent prediction, the file's first
+        # Processing event and the first Approved event after it, each an index lookup
         query = """
+        WITH Sources AS (
+            SELECT
+                p.*,
+                (
+                    SELECT MIN(e.StatusUpdateDate)
+                    FROM TaxProcessingEvents e
+                    WHERE e.TaxFileID = p.TaxFileID AND e.NewStatus = 'Processing'
+                ) as SourceDate
+            FROM
+                TaxRefundPredictions p
+            WHERE
+                p.CreatedAt > ?
+        ),
+        Outcomes AS (
+            SELECT
+                s.*,
+                (
+                    SELECT MIN(e.StatusUpdateDate)
+                    FROM TaxProcessingEvents e
+                    WHERE e.TaxFileID = s.TaxFileID AND e.NewStatus = 'Approved' AND e.StatusUpdateDate > s.SourceDate
+                ) as TargetDate
+            FROM
+                Sources s
+        )
         SELECT
-            p.PredictionID,
-            p.TaxFileID,
-            p.ConfidenceScore,
-            p.ModelVersion,
-            p.PredictedAvailabilityDate,
-            p.InputFeatures,
-            p.CreatedAt as PredictionDate,
-            e1.StatusUpdateDate as SourceDate,
-            e2.StatusUpdateDate as TargetDate,
-            julianday(e2.StatusUpdateDate) - julianday(e1.StatusUpdateDate) as ActualTransitionDays,
-            julianday(p.PredictedAvailabilityDate) - julianday(e1.StatusUpdateDate) as PredictedTransitionDays
+            PredictionID,
+            TaxFileID,
+            ConfidenceScore,
+            ModelVersion,
+            PredictedAvailabilityDate,
+            InputFeatures,
+            CreatedAt as PredictionDate,
+            SourceDate,
+            TargetDate,
+            julianday(TargetDate) - julianday(SourceDate) as ActualTransitionDays,
+            julianday(PredictedAvailabilityDate) - julianday(SourceDate) as PredictedTransitionDays
         FROM
-            TaxRefundPredictions p
-        JOIN
-            TaxProcessingEvents e1 ON p.TaxFileID = e1.TaxFileID AND e1.NewStatus = 'Processing'
-        JOIN
-            TaxProcessingEvents e2 ON p.TaxFileID = e2.TaxFileID AND e2.NewStatus = 'Approved' AND e1.StatusUpdateDate < e2.StatusUpdateDate
+            Outcomes
         WHERE
-            p.CreatedAt > ?
+            TargetDate IS NOT NULL
         ORDER BY
-            p.CreatedAt DESC
+            CreatedAt DESC
         """
         
-        df = pd.read_sql_query(query, conn, params=(cutoff_date,))
-        conn.close()
+        for df in pd.read_sql_query(query, conn, params=(cutoff_date,), chunksize=EXTRACT_CHUNK_SIZE):
+            if df.empty:
+                continue
+            total_rows += len(df)
+            yield df
         
-        logger.info(f"Extracted {len(df)} prediction outcomes from online database")
-        return df
+        logger.info(f"Extracted {total_rows} prediction outcomes from online database")
     except Exception as e:
         logger.error(f"Error extracting prediction outcomes: {str(e)}")
-        return pd.DataFrame()  # Return empty DataFrame on error
+    finally:
+        conn.close()
 
 def transform_prediction_outcomes(df: pd.DataFrame) -> pd.DataFrame:
     """Transform prediction outcomes data."""
@@ -446,14 +613,14 @@ def transform_prediction_outcomes(df: pd.DataFrame) -> pd.DataFrame:
         return pd.DataFrame()
     
     try:
-        # Parse InputFeatures JSON
-        df['InputFeatures'] = df['InputFeatures'].apply(lambda x: json.loads(x) if x else {})
+        # InputFeatures JSON is stored as-is; only missing values are normalized to an empty object
+        df['InputFeatures'] = [x if x else '{}' for x in df['InputFeatures'].to_numpy()]
         
         # Calculate error days
         df['ErrorDays'] = df['PredictedTransitionDays'] - df['ActualTransitionDays']
         
         # Add metadata
-        df['OutcomeID'] = [f'outcome-{uuid.uuid4()}' for _ in range(len(df))]
+        df['OutcomeID'] = _uuid_col('outcome', len(df))
         df['CreatedAt'] = datetime.now().isoformat()
         
         logger.info(f"Transformed {len(df)} prediction outcomes")
@@ -462,14 +629,10 @@ def transform_prediction_outcomes(df: pd.DataFrame) -> pd.DataFrame:
         logger.error(f"Error transforming prediction outcomes: {str(e)}")
         return pd.DataFrame()
 
-def load_prediction_outcomes(df: pd.DataFrame) -> bool:
+def load_prediction_outcomes(outcome_chunks: Iterable[pd.DataFrame]) -> bool:
     """Load prediction outcomes into the offline database."""
     logger.info("Loading prediction outcomes into offline database")
     
-    if df.empty:
-        logger.warning("No prediction outcomes to load")
-        return False
-    
     try:
         conn = sqlite3.connect(OFFLINE_DB_PATH)
         cursor = conn.cursor()
@@ -497,41 +660,26 @@ def load_prediction_outcomes(df: pd.DataFrame) -> bool:
             )
             ''')
         
-        # Insert each prediction outcome
-        outcomes_stored = 0
-        for _, row in df.iterrows():
-            # Check if this prediction outcome already exists
-            cursor.execute(
-                "SELECT COUNT(*) FROM PredictionOutcomes WHERE PredictionID = ?",
-                (row['PredictionID'],)
-            )
-            if cursor.fetchone()[0] > 0:
-                continue  # Skip if already exists
-            
-            cursor.execute('''
-            INSERT INTO PredictionOutcomes (
-                OutcomeID, PredictionID, TaxFileID, ConfidenceScore, ModelVersion,
-                PredictedAvailabilityDate, PredictedTransitionDays, ActualTransitionDays,
-                ErrorDays, InputFeatures, CreatedAt
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row['OutcomeID'],
-                row['PredictionID'],
-                row['TaxFileID'],
-                row['ConfidenceScore'],
-                row['ModelVersion'],
-                row['PredictedAvailabilityDate'],
-                row['PredictedTransitionDays'],
-                row['ActualTransitionDays'],
-                row['ErrorDays'],
-                json.dumps(row['InputFeatures']),
-                row['CreatedAt']
-            ))
-            outcomes_stored += 1
+        # One outcome per prediction: the unique index lets INSERT OR IGNORE skip known predictions
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_prediction_outcomes_prediction ON PredictionOutcomes(PredictionID)")
+        
+        # Insert each chunk with a single executemany as it arrives
+        outcomes_received = 0
+        changes_before = conn.total_changes
+        for df in outcome_chunks:
+            if df.empty:
+                continue
+            _insert_rows(conn, 'PredictionOutcomes', PREDICTION_OUTCOME_COLUMNS, df, or_ignore=True)
+            outcomes_received += len(df)
+        outcomes_stored = conn.total_changes - changes_before
         
         conn.commit()
         conn.close()
         
+        if not outcomes_received:
+            logger.warning("No prediction outcomes to load")
+            return False
+        
         logger.info(f"Loaded {outcomes_stored} prediction outcomes into offline database")
         return True
     except Exception as e:
@@ -546,20 +694,24 @@ def run_etl_process() -> None:
         # Create offline database if it doesn't exist
         create_offline_db()
         
-        # Extract data from online database
-        raw_data = extract_data()
+        # Create ETL job ID and a single timestamp shared by every row this run writes
+        etl_job_id = str(uuid.uuid4())
+        run_timestamp = datetime.now().isoformat()
         
-        # Transform data
-        training_data, stats_df = transform_data(raw_data)
+        # Extract, transform and load the training data one chunk at a time
+        training_chunks = (
+            transform_data(raw_data, etl_job_id, run_timestamp)
+            for raw_data in extract_data()
+        )
         
         # Load data into offline database
-        load_data(training_data, stats_df)
-        
-        # Extract prediction outcomes
-        prediction_outcomes_data = extract_prediction_outcomes()
+        load_data(training_chunks, etl_job_id, run_timestamp)
         
-        # Transform prediction outcomes
-        transformed_outcomes = transform_prediction_outcomes(prediction_outcomes_data)
+        # Extract, transform and load the prediction outcomes one chunk at a time
+        transformed_outcomes = (
+            transform_prediction_outcomes(prediction_outcomes_data)
+            for prediction_outcomes_data in extract_prediction_outcomes()
+        )
         
         # Load prediction outcomes
         load_prediction_outcomes(transformed_outcomes)
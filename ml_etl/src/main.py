@@ -8,10 +8,14 @@ using the new database schema and model monitoring capabilities.
 
 import os
 import sys
+import atexit
 import logging
 import argparse
+import sqlite3
+import signal
 import subprocess
-from datetime import datetime
+import threading
+import time
 
 # Configure logging
 logging.basicConfig(
@@ -23,15 +27,12 @@ logger = logging.getLogger(__name__)
 # Add src directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Import modules
-from src.etl.etl_process import run_etl_process
-logger.info("Using ETL process")
+# Latest (RetrainingRecommended, DecisionEpoch) row, keyed by database path and file mtimes
+_decision_cache = {}
 
-from src.ml.model_training import run_model_training
-logger.info("Using model training process")
-
-from src.ml.model_api import run_api_server
-logger.info("Using model API server")
+# Read-only connection reused across scheduler runs
+_decision_conn = None
+_decision_conn_path = None
 
 def parse_args():
     """Parse command line arguments."""
@@ -70,6 +71,8 @@ def run_etl():
     """Run the ETL process."""
     logger.info("Starting ETL process")
     try:
+        # Imported on use so other modes do not pay for pandas and the ETL module
+        from src.etl.etl_process import run_etl_process
         run_etl_process()
         logger.info("ETL process completed successfully")
         return True
@@ -86,6 +89,8 @@ def run_training(force=False):
             logger.info("Skipping training as it's not recommended at this time")
             return True
         
+        # Imported on use so other modes do not pay for scikit-learn and the training module
+        from src.ml.model_training import run_model_training
         run_model_training()
         logger.info("Model training process completed successfully")
         return True
@@ -93,11 +98,15 @@ def run_training(force=False):
         logger.error(f"Model training process failed: {str(e)}")
         return False
 
+def _db_mtime_key(db_path):
+    """Return the modification times of the database and its WAL file."""
+    wal_path = f"{db_path}-wal"
+    wal_mtime = os.stat(wal_path).st_mtime_ns if os.path.exists(wal_path) else None
+    return os.stat(db_path).st_mtime_ns, wal_mtime
+
 def should_skip_training():
     """Check if training should be skipped based on retraining decisions."""
     try:
-        import sqlite3
-        
         # Database path
         db_path = os.environ.get('OFFLINE_DB_PATH', os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../ml_etl/data/processed/tax_refund_analytics.db')))
         
@@ -105,35 +114,23 @@ def should_skip_training():
         if not os.path.exists(db_path):
             return False  # If no database, don't skip training
         
-        # Connect to database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Check if RetrainingDecisions table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='RetrainingDecisions'")
-        if cursor.fetchone() is None:
-            conn.close()
-            return False  # If no table, don't skip training
-        
-        # Get latest retraining decision
-        cursor.execute("""
-        SELECT RetrainingRecommended, DecisionDate
-        FROM RetrainingDecisions
-        ORDER BY DecisionDate DESC
-        LIMIT 1
-        """)
-        
-        row = cursor.fetchone()
-        conn.close()
+        # The latest decision only changes when the database (or its WAL) is written,
+        # so reuse the cached row while the files are untouched
+        cache_key = (db_path, _db_mtime_key(db_path))
+        if cache_key in _decision_cache:
+            row = _decision_cache[cache_key]
+        else:
+            row = _fetch_latest_decision(db_path)
+            _decision_cache.clear()
+            _decision_cache[cache_key] = row
         
         if row is None:
-            return False  # If no decisions, don't skip training
+            return False  # If no table or no decisions, don't skip training
         
-        retraining_recommended, decision_date = row
+        retraining_recommended, decision_epoch = row
         
         # If decision is older than 7 days, ignore it
-        decision_date = datetime.fromisoformat(decision_date)
-        days_since_decision = (datetime.now() - decision_date).days
+        days_since_decision = int((time.time() - decision_epoch) // 86400)
         
         if days_since_decision > 7:
             return False  # If decision is old, don't skip training
@@ -149,10 +146,65 @@ def should_skip_training():
         logger.warning(f"Error checking retraining decisions: {str(e)}")
         return False  # If error, don't skip training
 
+def _get_decision_conn(db_path):
+    """Return the shared read-only connection to the offline database, opening it on first use."""
+    global _decision_conn, _decision_conn_path
+    if _decision_conn is None or _decision_conn_path != db_path:
+        _close_decision_conn()
+        # Open read-only so the lookup never creates journal files
+        _decision_conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        # Reader tuning: larger page cache, in-memory temp storage, wait out ETL write locks
+        _decision_conn.executescript("""
+        PRAGMA cache_size = -20000;
+        PRAGMA temp_store = MEMORY;
+        PRAGMA busy_timeout = 5000;
+        PRAGMA query_only = true;
+        """)
+        _decision_conn_path = db_path
+    return _decision_conn
+
+def _close_decision_conn():
+    """Close the shared read-only connection, if open."""
+    global _decision_conn, _decision_conn_path
+    if _decision_conn is not None:
+        _decision_conn.close()
+    _decision_conn = None
+    _decision_conn_path = None
+
+atexit.register(_close_decision_conn)
+
+def _fetch_latest_decision(db_path):
+    """Read the latest retraining decision, or None if there is none."""
+    try:
+        cursor = _get_decision_conn(db_path).cursor()
+        
+        # Get latest retraining decision
+        cursor.execute("""
+        SELECT RetrainingRecommended, DecisionEpoch
+        FROM RetrainingDecisions
+        WHERE DecisionEpoch IS NOT NULL
+        ORDER BY DecisionEpoch DESC
+        LIMIT 1
+        """)
+        
+        return cursor.fetchone()
+    except sqlite3.OperationalError as e:
+        # No RetrainingDecisions table yet means there is no decision
+        if 'no such table' in str(e):
+            return None
+        _close_decision_conn()
+        raise
+    except sqlite3.Error:
+        # Reopen on the next call, e.g. if the database file was replaced
+        _close_decision_conn()
+        raise
+
 def run_api():
     """Run the API server."""
     logger.info("Starting API server")
     try:
+        # Imported on use so other modes do not pay for FastAPI and uvicorn
+        from src.ml.model_api import run_api_server
         run_api_server()
         # Note: This will block until the server is stopped
         return True
@@ -178,15 +230,28 @@ def run_monitoring():
         logger.error(f"Model monitoring failed: {str(e)}")
         return False
 
-def schedule_job(interval_hours, include_monitoring=True):
+def schedule_job(interval_hours, include_monitoring=True, stop_event=None):
     """Schedule the ETL, training, and monitoring processes to run periodically."""
     logger.info(f"Scheduling jobs to run every {interval_hours} hours")
     
-    # This is a simple implementation using a loop and sleep
+    # This is a simple implementation using a loop and a timed wait
     # In a production environment, you would use a proper scheduler like cron or Airflow
-    import time
     
-    while True:
+    # SIGTERM ends the wait immediately so the process can shut down between runs;
+    # SIGINT keeps its default, so Ctrl-C still interrupts a running job at once.
+    # Signal handlers can only be installed from the main thread
+    if stop_event is None:
+        stop_event = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        else:
+            logger.warning("Scheduler is not running on the main thread; SIGTERM will not stop it")
+    
+    # Runs start on a fixed cadence from the monotonic clock, so job runtime does not add drift
+    interval_seconds = interval_hours * 3600
+    deadline = time.monotonic()
+    
+    while not stop_event.is_set():
         # Run ETL
         etl_success = run_etl()
         
@@ -198,9 +263,15 @@ def schedule_job(interval_hours, include_monitoring=True):
         if etl_success:
             run_training()
         
-        # Sleep for the specified interval
-        logger.info(f"Sleeping for {interval_hours} hours until next run")
-        time.sleep(interval_hours * 3600)
+        # Wait until the next run is due, skipping any runs missed by a long job
+        deadline += interval_seconds
+        now = time.monotonic()
+        if deadline < now:
+            deadline += ((now - deadline) // interval_seconds + 1) * interval_seconds
+        logger.info(f"Waiting {(deadline - now) / 3600:.2f} hours until next run")
+        stop_event.wait(deadline - now)
+    
+    logger.info("Scheduler stopped")
 
 def main():
     """Main function."""
@@ -8,18 +8,28 @@ and serve predictions for tax refund processing times.
 
 import os
 import json
+import bisect
+import asyncio
 import logging
+import concurrent.futures
 import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import FunctionTransformer
+from sklearn.utils import check_array
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Callable, Tuple
 import uvicorn
 from fastapi import FastAPI, HTTPException, Query, Depends
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 # Configure logging
 import os
 import sys
-from logging.handlers import RotatingFileHandler
+import queue
+import atexit
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 # Create logs directory if it doesn't exist
 logs_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../ml_etl/logs'))
@@ -44,13 +54,17 @@ file_formatter = logging.Formatter(log_format)
 console_handler.setFormatter(console_formatter)
 file_handler.setFormatter(file_formatter)
 
-# Get the logger
+# Get the logger; set API_LOG_LEVEL=WARNING in production to keep request logging off
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+logger.setLevel(os.environ.get('API_LOG_LEVEL', 'INFO').upper())
 
-# Add handlers to logger
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+# Records are queued and written to the console and file by a background thread,
+# so request handlers never block on log I/O
+log_queue = queue.SimpleQueue()
+logger.addHandler(QueueHandler(log_queue))
+log_listener = QueueListener(log_queue, console_handler, file_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
 
 # Prevent propagation to avoid duplicate logs
 logger.propagate = False
@@ -82,8 +96,43 @@ model_metadata = None
 model_version = "unknown"
 model_id = None
 
+# Model input columns, in order; replaced by the loaded model's feature_list
+DEFAULT_FEATURE_COLUMNS = [
+    'FilingType', 'TaxYear', 'ClaimedRefundAmount', 'GeographicRegion',
+    'ProcessingCenter', 'FilingPeriod', 'RefundAmountBucket'
+]
+feature_columns = DEFAULT_FEATURE_COLUMNS
+
+# Specialized per-tree scoring function for the loaded pipeline (see _build_scorer)
+scorer = None
+
+# Set once the startup model load has finished (successfully or not)
+model_ready = asyncio.Event()
+_model_load_task = None
+
+# Parsed listing of MODEL_DIR, rescanned only when the directory's mtime changes
+_models_cache = {"mtime": None, "versions": [], "has_latest": False}
+
+# Refund amount buckets; an amount equal to an edge falls in the higher bucket
+REFUND_BUCKET_EDGES = (1000, 3000, 5000)
+REFUND_BUCKET_LABELS = ("0-1000", "1000-3000", "3000-5000", "5000+")
+_REFUND_BUCKET_EDGES_ARRAY = np.array(REFUND_BUCKET_EDGES, dtype=np.float64)
+_REFUND_BUCKET_LABELS_ARRAY = np.array(REFUND_BUCKET_LABELS, dtype=object)
+
+# Number of distinct feature sets whose scores are memoized between model loads
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '4096'))
+
+# Threads that run prediction scoring off the event loop; created at startup
+PREDICT_THREADS = int(os.environ.get('PREDICT_THREADS', str(os.cpu_count() or 1)))
+_predict_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+# Seconds a prediction waits for the startup model load before returning 503
+MODEL_READY_TIMEOUT = float(os.environ.get('MODEL_READY_TIMEOUT', '5'))
+
 # Input and output models
 class PredictionRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     filing_type: str = Field(..., description="Type of tax filing (e.g., 'Individual', 'Joint')")
     tax_year: int = Field(..., description="Tax year")
     refund_amount: float = Field(..., description="Claimed refund amount")
@@ -94,6 +143,8 @@ class PredictionRequest(BaseModel):
     target_status: str = Field("Approved", description="Target status for prediction")
 
 class PredictionResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     estimated_days: int = Field(..., description="Estimated number of days for processing")
     confidence_score: float = Field(..., description="Confidence score of the prediction (0-1)")
     predicted_date: str = Field(..., description="Predicted date of completion")
@@ -101,10 +152,52 @@ class PredictionResponse(BaseModel):
 
 
 
+def _get_model_listing() -> Dict[str, Any]:
+    """Return the cached model listing, rescanning MODEL_DIR if it has changed."""
+    mtime = os.stat(MODEL_DIR).st_mtime_ns
+    if mtime != _models_cache["mtime"]:
+        files = os.listdir(MODEL_DIR)
+        
+        # Find all versioned model files, sorted by version (highest first)
+        versioned_models = []
+        for file in files:
+            if file.startswith('refund_prediction_model_v') and file.endswith('.joblib'):
+                version = int(file.split('_v')[1].split('.')[0])
+                versioned_models.append((version, os.path.join(MODEL_DIR, file)))
+        versioned_models.sort(reverse=True)
+        
+        _models_cache["versions"] = versioned_models
+        _models_cache["has_latest"] = os.path.basename(LATEST_MODEL_PATH) in files
+        _models_cache["mtime"] = mtime
+    return _models_cache
+
 @app.on_event("startup")
 async def startup_event():
-    """Load the model and metadata on startup."""
-    global model, model_metadata, model_version, model_id
+    """Start loading the model and metadata in the background on startup."""
+    global _model_load_task, _predict_pool
+    
+    # Scoring runs in this pool so the event loop stays free to accept requests
+    _predict_pool = concurrent.futures.ThreadPoolExecutor(max_workers=PREDICT_THREADS, thread_name_prefix="predict")
+    
+    # Load in a worker thread so the server starts accepting requests immediately
+    _model_load_task = asyncio.create_task(_load_model_in_background())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the prediction thread pool on shutdown."""
+    if _predict_pool is not None:
+        _predict_pool.shutdown(wait=False, cancel_futures=True)
+
+async def _load_model_in_background():
+    """Run the blocking model load off the event loop and signal readiness."""
+    try:
+        await asyncio.to_thread(load_model)
+    finally:
+        model_ready.set()
+
+def load_model():
+    """Load the model and metadata."""
+    global model, model_metadata, model_version, model_id, feature_columns, scorer
     
     try:
         # Check for model directory
@@ -115,7 +208,8 @@ async def startup_event():
         # First try to load the latest model
         if os.path.exists(LATEST_MODEL_PATH):
             logger.info(f"Loading latest model from {LATEST_MODEL_PATH}")
-            model = joblib.load(LATEST_MODEL_PATH)
+            # Memory-map the model's arrays read-only so workers share them via the page cache
+            model = joblib.load(LATEST_MODEL_PATH, mmap_mode='r')
             
             # Load latest metadata
             if os.path.exists(LATEST_METADATA_PATH):
@@ -134,20 +228,14 @@ async def startup_event():
             # If latest model doesn't exist, find the highest version
             logger.warning(f"Latest model not found at {LATEST_MODEL_PATH}, looking for versioned models")
             
-            # Find all versioned model files
-            versioned_models = []
-            for file in os.listdir(MODEL_DIR):
-                if file.startswith('refund_prediction_model_v') and file.endswith('.joblib'):
-                    version = int(file.split('_v')[1].split('.')[0])
-                    versioned_models.append((version, os.path.join(MODEL_DIR, file)))
+            # Versioned model files, sorted by version (highest first)
+            versioned_models = _get_model_listing()["versions"]
             
             if versioned_models:
-                # Sort by version (highest first)
-                versioned_models.sort(reverse=True)
                 highest_version, highest_model_path = versioned_models[0]
                 
                 logger.info(f"Loading highest version model (v{highest_version}) from {highest_model_path}")
-                model = joblib.load(highest_model_path)
+                model = joblib.load(highest_model_path, mmap_mode='r')
                 
                 # Load corresponding metadata
                 metadata_path = os.path.join(MODEL_DIR, f'model_metadata_v{highest_version}.json')
@@ -163,29 +251,40 @@ async def startup_event():
                 logger.info(f"Successfully loaded model {model_version}")
             else:
                 logger.warning(f"No model files found in {MODEL_DIR}")
+        
+        # Column order the model was trained with
+        if model_metadata and 'feature_list' in model_metadata:
+            feature_columns = list(model_metadata['feature_list'])
+        else:
+            feature_columns = DEFAULT_FEATURE_COLUMNS
+        
+        scorer = _build_scorer(model) if model is not None else None
+        _score_features.cache_clear()
+        if model is not None and scorer is None:
+            logger.warning("Model pipeline has an unexpected shape, using generic scoring")
     
     except Exception as e:
         logger.error(f"Error loading model: {str(e)}")
         model = None
         model_metadata = {"version": "unknown", "error": str(e)}
         model_id = None
+        scorer = None
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     # Check for available models
     available_models = []
+    has_latest = False
     if os.path.exists(MODEL_DIR):
-        for file in os.listdir(MODEL_DIR):
-            if file.startswith('refund_prediction_model_v') and file.endswith('.joblib'):
-                version = file.split('_v')[1].split('.')[0]
-                available_models.append(f"v{version}")
-    
-    has_latest = os.path.exists(LATEST_MODEL_PATH)
+        listing = _get_model_listing()
+        available_models = [f"v{version}" for version, _ in listing["versions"]]
+        has_latest = listing["has_latest"]
     
     return {
         "status": "ok" if model is not None else "error",
         "model_loaded": model is not None,
+        "model_loading": not model_ready.is_set(),
         "model_version": model_version,
         "model_id": model_id,
         "latest_available": has_latest,
@@ -202,16 +301,107 @@ async def get_metadata():
     return model_metadata
 
 
+def _build_scorer(pipeline) -> Optional[Callable[[List[Dict[str, Any]]], np.ndarray]]:
+    """Specialize per-tree scoring for a fitted random-forest pipeline.
+    
+    Handles both the ordinal/passthrough preprocessing built by model_training and the
+    one-hot/scaler preprocessing of older models. The categorical lookups and scaler
+    parameters are frozen into a closure that writes
+    the feature rows directly, bypassing pandas and the ColumnTransformer. Returns None
+    if the pipeline does not have the shape built by model_training.
+    """
+    try:
+        preprocessor = pipeline.named_steps['preprocessor']
+        trees = [tree.tree_ for tree in pipeline.named_steps['regressor'].estimators_]
+        
+        offset = 0
+        cat_lookups = []  # (column, {category: output index}) for one-hot columns
+        ordinal_lookups = []  # (output index, column, {category: code}, unknown code)
+        num_columns, num_slice, num_mean, num_scale = [], None, 0.0, 1.0
+        for name, transformer, columns in preprocessor.transformers_:
+            if name == 'cat' and 'ordinal' in transformer.named_steps:
+                encoder = transformer.named_steps['ordinal']
+                if encoder.handle_unknown != 'use_encoded_value' or getattr(encoder, '_infrequent_enabled', False):
+                    return None
+                for column, categories in zip(columns, encoder.categories_):
+                    ordinal_lookups.append((offset, column, {category: float(i) for i, category in enumerate(categories)}, float(encoder.unknown_value)))
+                    offset += 1
+            elif name == 'cat':
+                ohe = transformer.named_steps['onehot']
+                if ohe.handle_unknown != 'ignore' or ohe.drop_idx_ is not None or getattr(ohe, '_infrequent_enabled', False):
+                    return None
+                for column, categories in zip(columns, ohe.categories_):
+                    cat_lookups.append((column, {category: offset + i for i, category in enumerate(categories)}))
+                    offset += len(categories)
+            elif name == 'num':
+                if transformer == 'passthrough' or isinstance(transformer, FunctionTransformer):
+                    # Fitted 'passthrough'
+                    if getattr(transformer, 'func', None) is not None:
+                        return None
+                else:
+                    scaler = transformer.named_steps['scaler']
+                    num_mean = scaler.mean_ if scaler.with_mean else 0.0
+                    num_scale = scaler.scale_ if scaler.with_std else 1.0
+                num_columns = list(columns)
+                num_slice = slice(offset, offset + len(num_columns))
+                offset += len(num_columns)
+            elif transformer != 'drop' and len(columns):
+                return None
+        
+        if not trees or trees[0].n_features != offset:
+            return None
+    except (AttributeError, KeyError, TypeError):
+        return None
+    
+    def score(rows: List[Dict[str, Any]]) -> np.ndarray:
+        matrix = np.zeros((len(rows), offset), dtype=np.float64)
+        for i, features in enumerate(rows):
+            for column, lookup in cat_lookups:
+                index = lookup.get(features[column])
+                if index is not None:  # Unknown categories encode as all zeros
+                    matrix[i, index] = 1.0
+            for index, column, lookup, unknown in ordinal_lookups:
+                matrix[i, index] = lookup.get(features[column], unknown)
+        if num_columns:
+            values = np.array([[features[c] for c in num_columns] for features in rows], dtype=np.float64)
+            matrix[:, num_slice] = (values - num_mean) / num_scale
+        tree_input = matrix.astype(np.float32)
+        return np.column_stack([tree.predict(tree_input).ravel() for tree in trees])
+    
+    return score
+
+def predict_trees(rows: List[Dict[str, Any]]) -> np.ndarray:
+    """Return each tree's predictions for the input rows, shaped (rows, trees)."""
+    if scorer is not None:
+        return scorer(rows)
+    
+    # Generic path through the fitted pipeline
+    # Build the frame from one object array in the model's column order,
+    # which skips per-column dtype inference of a dict of lists
+    input_df = pd.DataFrame(
+        np.array([[input_data[col] for col in feature_columns] for input_data in rows], dtype=object),
+        columns=feature_columns
+    )
+    
+    # Access the preprocessor and RandomForestRegressor from the pipeline
+    # Based on model_training.py, the structure is:
+    # Pipeline(steps=[('preprocessor', ColumnTransformer(...)), ('regressor', RandomForestRegressor(...))])
+    preprocessor = model.named_steps['preprocessor']
+    rf = model.named_steps['regressor']
+    transformed_data = preprocessor.transform(input_df)
+    
+    # Validate the input once, then query each fitted tree_ directly instead of
+    # going through DecisionTreeRegressor.predict's per-call input checks
+    tree_input = check_array(transformed_data, dtype=np.float32, accept_sparse='csr')
+    return np.column_stack([tree.tree_.predict(tree_input).ravel() for tree in rf.estimators_])
+
 def determine_refund_amount_bucket(amount: float) -> str:
     """Determine the refund amount bucket based on the amount."""
-    if amount < 1000:
-        return "0-1000"
-    elif amount < 3000:
-        return "1000-3000"
-    elif amount < 5000:
-        return "3000-5000"
-    else:
-        return "5000+"
+    return REFUND_BUCKET_LABELS[bisect.bisect_right(REFUND_BUCKET_EDGES, amount)]
+
+def determine_refund_amount_buckets(amounts: np.ndarray) -> np.ndarray:
+    """Determine the refund amount buckets for an array of amounts."""
+    return _REFUND_BUCKET_LABELS_ARRAY[np.searchsorted(_REFUND_BUCKET_EDGES_ARRAY, amounts, side='right')]
 
 def determine_filing_period(filing_date: Optional[datetime] = None) -> str:
     """Determine the filing period based on the filing date."""
@@ -227,139 +417,163 @@ def determine_filing_period(filing_date: Optional[datetime] = None) -> str:
     else:  # May-December
         return "Late"
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
-    """Predict tax refund processing time."""
-    global model, model_metadata, model_version, model_id
+async def _wait_for_model() -> None:
+    """Wait briefly for the startup model load and fail with 503 if no model is available."""
+    # Wait briefly for the startup model load, if it is still running
+    if not model_ready.is_set():
+        try:
+            await asyncio.wait_for(model_ready.wait(), timeout=MODEL_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Model is still loading")
     
     # If no model is available, return error
     if model is None:
         raise HTTPException(status_code=503, detail="No model available for prediction")
-    
-    try:
-        # Prepare input data
+
+def _prediction_features(request: PredictionRequest, refund_amount_bucket: Optional[str] = None) -> Dict[str, Any]:
+    """Build the model input features for a prediction request."""
+    # Prepare input data
+    if refund_amount_bucket is None:
         refund_amount_bucket = determine_refund_amount_bucket(request.refund_amount)
-        filing_period = request.filing_period or determine_filing_period()
-        
-        # Create feature dataframe
-        input_data = {
-            'FilingType': [request.filing_type],
-            'TaxYear': [request.tax_year],
-            'RefundAmountBucket': [refund_amount_bucket],
-            'GeographicRegion': [request.geographic_region],
-            'ProcessingCenter': [request.processing_center],
-            'FilingPeriod': [filing_period],
-            'ClaimedRefundAmount': [request.refund_amount]
-        }
-        
-        # Add any additional features needed by the model
-        if model_metadata and 'feature_list' in model_metadata:
-            feature_list = model_metadata['feature_list']
+    filing_period = request.filing_period or determine_filing_period()
+    
+    return {
+        'FilingType': request.filing_type,
+        'TaxYear': request.tax_year,
+        'RefundAmountBucket': refund_amount_bucket,
+        'GeographicRegion': request.geographic_region,
+        'ProcessingCenter': request.processing_center,
+        'FilingPeriod': filing_period,
+        'ClaimedRefundAmount': request.refund_amount
+    }
 
-        # Log input features
-        logger.info(f"Prediction request received with features:")
-        for feature, value in input_data.items():
-            logger.info(f"  {feature}: {value[0]}")
-        
-        import pandas as pd
-        input_df = pd.DataFrame(input_data)
-        
-        # Make prediction using the model
-        predicted_days = int(model.predict(input_df)[0])
-        
-        # Calculate prediction-specific confidence score using the RandomForestRegressor
-        try:
-            # Access the RandomForestRegressor from the pipeline
-            # Based on model_training.py, the structure is:
-            # Pipeline(steps=[('preprocessor', ColumnTransformer(...)), ('regressor', RandomForestRegressor(...))])
-            rf = model.named_steps['regressor']
-            
-            # Transform the input data using the preprocessor
-            preprocessor = model.named_steps['preprocessor']
-            transformed_data = preprocessor.transform(input_df)
-            
-            # Get predictions from all trees in the forest
-            tree_predictions = [tree.predict(transformed_data)[0] for tree in rf.estimators_]
-            
-            # Calculate standard deviation of predictions across trees
-            # Higher variance/std_dev means lower confidence
-            mean_prediction = sum(tree_predictions) / len(tree_predictions)
-            variance = sum((pred - mean_prediction) ** 2 for pred in tree_predictions) / len(tree_predictions)
-            std_dev = variance ** 0.5
-            
-            # Convert std_dev to a confidence score (0.5-0.95)
-            # Lower std_dev = higher confidence
-            max_expected_std = 3.0  # Adjust based on your data's scale
-            confidence_score = 0.95 - min(0.45, (std_dev / max_expected_std) * 0.45)
-            
-            # Round to 2 decimal places for readability
-            confidence_score = round(confidence_score, 2)
-            
-            logger.info(f"Tree prediction std dev: {std_dev:.2f}, resulting in confidence: {confidence_score}")
-            
-        except Exception as e:
-            # Fallback to metadata-based confidence if anything goes wrong
-            logger.warning(f"Error calculating prediction-specific confidence: {str(e)}")
-            confidence_score = 0.85  # Default
-            if model_metadata and 'test_metrics' in model_metadata and 'r2' in model_metadata['test_metrics']:
-                # Use R² as a basis for confidence
-                confidence_score = min(0.95, max(0.5, 0.5 + model_metadata['test_metrics']['r2'] * 0.5))
-        
-        # Calculate predicted date
-        today = datetime.now()
-        predicted_date = (today + timedelta(days=predicted_days)).date().isoformat()
+def _score_trees(tree_predictions: np.ndarray) -> Tuple[int, float]:
+    """Return the estimated days and confidence score from one row's per-tree predictions."""
+    # Make prediction using the model; the forest prediction is the mean over trees
+    predicted_days = int(tree_predictions.mean())
+    
+    # Calculate prediction-specific confidence score using the RandomForestRegressor
+    try:
+        # Calculate standard deviation of predictions across trees
+        # Higher variance/std_dev means lower confidence
+        std_dev = float(tree_predictions.std())
         
-        # Create response
-        response = {
-            "estimated_days": predicted_days,
-            "confidence_score": confidence_score,
-            "predicted_date": predicted_date,
-            "model_version": model_version
-        }
+        # Convert std_dev to a confidence score (0.5-0.95)
+        # Lower std_dev = higher confidence
+        max_expected_std = 3.0  # Adjust based on your data's scale
+        confidence_score = 0.95 - min(0.45, (std_dev / max_expected_std) * 0.45)
         
-        # Log prediction outcome
-        logger.info(f"Prediction outcome:")
-        logger.info(f"  Estimated Days: {predicted_days}")
-        logger.info(f"  Confidence Score: {confidence_score:.2f}")
-        logger.info(f"  Predicted Date: {predicted_date}")
-        logger.info(f"  Model Version: {model_version}")
+        # Round to 2 decimal places for readability
+        confidence_score = round(confidence_score, 2)
         
-        # Prediction storage is handled by the service
+        logger.debug("Tree prediction std dev: %.2f, resulting in confidence: %s", std_dev, confidence_score)
         
-        return response
+    except Exception as e:
+        # Fallback to metadata-based confidence if anything goes wrong
+        logger.warning(f"Error calculating prediction-specific confidence: {str(e)}")
+        confidence_score = 0.85  # Default
+        if model_metadata and 'test_metrics' in model_metadata and 'r2' in model_metadata['test_metrics']:
+            # Use R² as a basis for confidence
+            confidence_score = min(0.95, max(0.5, 0.5 + model_metadata['test_metrics']['r2'] * 0.5))
+    
+    return predicted_days, confidence_score
+
+@lru_cache(maxsize=PREDICTION_CACHE_SIZE)
+def _score_features(features_key: Tuple[Tuple[str, Any], ...]) -> Tuple[int, float]:
+    """Score one set of input features, memoized by their (name, value) pairs."""
+    return _score_trees(predict_trees([dict(features_key)])[0])
+
+def _prediction_response(predicted_days: int, confidence_score: float) -> PredictionResponse:
+    """Build the prediction response for a scored row."""
+    # Calculate predicted date
+    today = datetime.now()
+    predicted_date = (today + timedelta(days=predicted_days)).date().isoformat()
+    
+    # Create response; returning the model instance lets FastAPI skip re-validating a dict
+    return PredictionResponse(
+        estimated_days=predicted_days,
+        confidence_score=confidence_score,
+        predicted_date=predicted_date,
+        model_version=model_version
+    )
+
+def _predict_sync(request: PredictionRequest) -> PredictionResponse:
+    """Score a single validated prediction request."""
+    input_data = _prediction_features(request)
+    
+    # Repeated requests with identical features are served from the cache
+    response = _prediction_response(*_score_features(tuple(input_data.items())))
+    
+    # Log the request and outcome as one line; arguments are only formatted at DEBUG
+    logger.debug(
+        "Prediction: features=%s, estimated_days=%s, confidence=%.2f, predicted_date=%s, model_version=%s",
+        input_data, response.estimated_days, response.confidence_score, response.predicted_date, model_version
+    )
+    
+    # Prediction storage is handled by the service
+    
+    return response
+
+def _predict_batch_sync(requests: List[PredictionRequest]) -> List[PredictionResponse]:
+    """Score a batch of validated prediction requests."""
+    # Score all rows together: each tree is traversed once for the whole batch
+    buckets = determine_refund_amount_buckets(np.array([request.refund_amount for request in requests], dtype=np.float64))
+    tree_predictions = predict_trees([
+        _prediction_features(request, bucket) for request, bucket in zip(requests, buckets)
+    ])
+    return [_prediction_response(*_score_trees(row)) for row in tree_predictions]
+
+@app.post("/predict", response_model=PredictionResponse)
+async def predict(request: PredictionRequest):
+    """Predict tax refund processing time."""
+    await _wait_for_model()
+    
+    try:
+        # Request validation has already run on the event loop; scoring runs in the thread pool
+        return await asyncio.get_running_loop().run_in_executor(_predict_pool, _predict_sync, request)
     
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+@app.post("/predict_batch", response_model=List[PredictionResponse])
+async def predict_batch(requests: List[PredictionRequest]):
+    """Predict tax refund processing times for several filings in one pass over the trees."""
+    await _wait_for_model()
+    
+    if not requests:
+        return []
+    
+    try:
+        responses = await asyncio.get_running_loop().run_in_executor(_predict_pool, _predict_batch_sync, requests)
+        
+        logger.debug("Batch prediction completed for %d items", len(responses))
+        return responses
+    
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
 def run_api_server():
     """Run the API server."""
     host = os.environ.get("HOST", "0.0.0.0")
     port = int(os.environ.get("PORT", "9090"))  # Use 9090 as default port
     
-    # Kill any existing process using the port
-    try:
-        import platform
-        import subprocess
-        
-        logger.info(f"Checking for processes using port {port}")
-        
-        if platform.system() == "Windows":
-            # Windows command
-            cmd = f"for /f \"tokens=5\" %a in ('netstat -ano ^| findstr :{port}') do taskkill /F /PID %a"
-            subprocess.run(cmd, shell=True, stderr=subprocess.DEVNULL)
-        else:
-            # Unix/Mac command
-            cmd = f"lsof -i tcp:{port} | grep LISTEN | awk '{{print $2}}' | xargs kill -9"
-            subprocess.run(cmd, shell=True, stderr=subprocess.DEVNULL)
-            
-        logger.info(f"Killed any processes using port {port}")
-    except Exception as e:
-        logger.warning(f"Error killing processes on port {port}: {str(e)}")
+    workers = int(os.environ.get("API_WORKERS", "1"))
     
     # Start the API server
-    logger.info(f"Starting API server on port {port}")
-    uvicorn.run(app, host=host, port=port)
+    # uvicorn binds with SO_REUSEADDR, so a socket left in TIME_WAIT by a previous
+    # server does not block the restart; there is no need to reap the port first
+    logger.info(f"Starting API server on port {port} with {workers} worker(s)")
+    
+    # loop/http "auto" use uvloop and httptools when installed (uvicorn[standard])
+    if workers > 1:
+        # Worker processes import the app themselves, and each loads the model at startup;
+        # app_dir puts ml_etl on the path so "src.ml.model_api" resolves however this was launched
+        app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+        uvicorn.run("src.ml.model_api:app", host=host, port=port, workers=workers, loop="auto", http="auto", app_dir=app_dir)
+    else:
+        uvicorn.run(app, host=host, port=port, loop="auto", http="auto")
 
 if __name__ == "__main__":
     run_api_server()
\ No newline at end of file
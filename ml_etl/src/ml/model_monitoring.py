@@ -9,16 +9,31 @@ This script monitors the performance of the deployed ML model by:
 """
 
 import os
+import sys
 import json
 import logging
 import sqlite3
 import uuid
+import random
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime, timedelta
+import joblib
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Dict, List, Tuple, Any, Optional, Iterator
 from sklearn.metrics import mean_absolute_error
-from scipy.stats import ks_2samp
+from scipy.stats import kstwo
+
+# Shared offline database helpers live in src/, one level above this script
+_SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _SRC_DIR not in sys.path:
+    sys.path.insert(0, _SRC_DIR)
+from offline_db import migrate_offline_db
 
 # Configure logging
 logging.basicConfig(
@@ -31,26 +46,201 @@ logger = logging.getLogger(__name__)
 OFFLINE_DB_PATH = os.environ.get('OFFLINE_DB_PATH', os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../ml_etl/data/processed/tax_refund_analytics.db')))
 MODEL_DIR = os.environ.get('MODEL_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../ml_etl/models')))
 
+# Rows drawn from TrainingData as the drift baseline
+TRAINING_SAMPLE_SIZE = 1000
+
+# Seconds a drift baseline sample is reused before it is redrawn
+TRAINING_SAMPLE_TTL = float(os.environ.get('TRAINING_SAMPLE_TTL', '3600'))
+
+# Last drift baseline sample, keyed by database path and model ID
+_training_sample_cache = {"key": None, "df": None, "drawn_at": 0.0}
+
+# Monitoring result inserts, kept as constants so the pooled writer reuses its prepared statements
+MODEL_PERFORMANCE_INSERT = """
+INSERT INTO ModelPerformance (
+    PerformanceID, ModelID, EvaluationDate, DataPartition,
+    EvaluationPeriod, SampleSize, MeanAbsoluteErrorDays,
+    AccuracyWithin7Days, ConfidenceScoreCorrelation
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+FEATURE_DRIFT_INSERT = """
+INSERT INTO FeatureDrift (
+    DriftID, ModelID, DetectionDate, FeatureDriftScore,
+    DriftDetected, SignificantFeatures, SampleSize,
+    BaselineStartDate, BaselineEndDate, CurrentStartDate, CurrentEndDate
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+RETRAINING_DECISION_INSERT = """
+INSERT INTO RetrainingDecisions (
+    DecisionID, ModelID, DecisionDate, ScheduleBasedRetraining,
+    PerformanceBasedRetraining, DriftBasedRetraining,
+    RetrainingRecommended, RecommendationReason, LastTrainingDate,
+    PerformanceMetricID, DriftMetricID, DecisionMadeBy, DecisionEpoch
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 # Print paths for debugging
 print(f"Offline DB path: {OFFLINE_DB_PATH}")
 print(f"Model directory: {MODEL_DIR}")
 
-def get_active_model_id() -> Optional[str]:
-    """Get the ID of the currently active model."""
-    try:
-        conn = sqlite3.connect(OFFLINE_DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check if MLModels table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='MLModels'")
-        if cursor.fetchone() is None:
+def _connect(db_path: str, read_only: bool = False) -> sqlite3.Connection:
+    """Open a connection to the offline database with WAL and reader-friendly tuning."""
+    if read_only:
+        # Read-only connections never create the database or its journal files
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        # WAL lets monitoring reads run alongside ETL writes; NORMAL sync trims fsyncs
+        conn.executescript("""
+        PRAGMA journal_mode = WAL;
+        PRAGMA synchronous = NORMAL;
+        """)
+    conn.executescript("""
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -64000;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA busy_timeout = 30000;
+    """)
+    return conn
+
+class _OfflinePool:
+    """One writer and up to `readers` read-only connections to the offline database, kept open between calls."""
+    
+    def __init__(self, db_path: str, readers: int = 4):
+        self.db_path = db_path
+        self._readers = queue.LifoQueue(maxsize=readers)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+    
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection, opening one if none is idle."""
+        # A missing database is created by the writer, as sqlite3.connect would
+        if not os.path.exists(self.db_path):
+            with self.write() as conn:
+                yield conn
+            return
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = _connect(self.db_path, read_only=True)
+        try:
+            yield conn
+        except BaseException:
+            # Any failure may leave an open statement or transaction, so the connection is not reused
             conn.close()
-            return None
+            raise
+        else:
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Hold the writer connection; commits on success and rolls back on error."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = _connect(self.db_path)
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+    
+    def close(self) -> None:
+        """Close every pooled connection."""
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+_pool: Optional[_OfflinePool] = None
+
+def _get_pool() -> _OfflinePool:
+    """Return the connection pool for OFFLINE_DB_PATH, reopening it if the path has changed."""
+    global _pool
+    if _pool is None or _pool.db_path != OFFLINE_DB_PATH:
+        _close_pool()
+        _pool = _OfflinePool(OFFLINE_DB_PATH)
+    return _pool
+
+def _close_pool() -> None:
+    """Close the connection pool, if open."""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+    _pool = None
+
+atexit.register(_close_pool)
+
+def _db_mtime_key(db_path: str) -> Optional[Tuple[int, Optional[int]]]:
+    """Return the modification times of the database and its WAL file, or None if it does not exist."""
+    if not os.path.exists(db_path):
+        return None
+    wal_path = f"{db_path}-wal"
+    wal_mtime = os.stat(wal_path).st_mtime_ns if os.path.exists(wal_path) else None
+    return os.stat(db_path).st_mtime_ns, wal_mtime
+
+# The lookups below are memoized by database path and file mtimes, so a repeat call
+# while the database is untouched is a dict hit; any write produces a new key
+
+@lru_cache(maxsize=1)
+def _existing_tables(db_path: str, mtime_key: Optional[Tuple[int, Optional[int]]]) -> frozenset:
+    """Return the names of the tables in the database, read once per database state."""
+    with _get_pool().read() as conn:
+        return frozenset(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"))
+
+@lru_cache(maxsize=8)
+def _query_active_model(db_path: str, mtime_key: Optional[Tuple[int, Optional[int]]]) -> Tuple[bool, Optional[tuple]]:
+    """Return whether MLModels exists and the active model row, if any."""
+    # Check if MLModels table exists
+    if 'MLModels' not in _existing_tables(db_path, mtime_key):
+        return False, None
+    
+    with _get_pool().read() as conn:
+        cursor = conn.cursor()
         
         # Get active model
         cursor.execute("SELECT ModelID FROM MLModels WHERE IsActive = 1 LIMIT 1")
-        row = cursor.fetchone()
-        conn.close()
+        return True, cursor.fetchone()
+
+@lru_cache(maxsize=8)
+def _query_model_row(db_path: str, mtime_key: Optional[Tuple[int, Optional[int]]], model_id: str) -> Tuple[bool, Optional[tuple]]:
+    """Return whether MLModels exists and the row for the given model, if any."""
+    # Check if MLModels table exists
+    if 'MLModels' not in _existing_tables(db_path, mtime_key):
+        return False, None
+    
+    with _get_pool().read() as conn:
+        cursor = conn.cursor()
+        
+        # Get model metadata
+        cursor.execute("""
+        SELECT 
+            ModelID, ModelVersion, Algorithm, Hyperparameters, 
+            FeatureList, TrainingDataSize, TrainingStartDate
+        FROM 
+            MLModels
+        WHERE 
+            ModelID = ?
+        """, (model_id,))
+        return True, cursor.fetchone()
+
+def get_active_model_id() -> Optional[str]:
+    """Get the ID of the currently active model."""
+    try:
+        has_models_table, row = _query_active_model(OFFLINE_DB_PATH, _db_mtime_key(OFFLINE_DB_PATH))
+        if not has_models_table:
+            return None
         
         if row:
             return row[0]
@@ -70,14 +260,9 @@ def get_active_model_id() -> Optional[str]:
 def get_model_metadata(model_id: str) -> Dict[str, Any]:
     """Get metadata for the specified model."""
     try:
-        conn = sqlite3.connect(OFFLINE_DB_PATH)
-        cursor = conn.cursor()
+        has_models_table, row = _query_model_row(OFFLINE_DB_PATH, _db_mtime_key(OFFLINE_DB_PATH), model_id)
         
-        # Check if MLModels table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='MLModels'")
-        if cursor.fetchone() is None:
-            conn.close()
-            
+        if not has_models_table:
             # Try to get metadata from file
             model_version = model_id.split('-')[-1]
             metadata_path = os.path.join(MODEL_DIR, f'model_metadata_v{model_version}.json')
@@ -93,20 +278,6 @@ def get_model_metadata(model_id: str) -> Dict[str, Any]:
             
             return {}
         
-        # Get model metadata
-        cursor.execute("""
-        SELECT 
-            ModelID, ModelVersion, Algorithm, Hyperparameters, 
-            FeatureList, TrainingDataSize, TrainingStartDate
-        FROM 
-            MLModels
-        WHERE 
-            ModelID = ?
-        """, (model_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
         if not row:
             return {}
         
@@ -130,8 +301,6 @@ def get_model_metadata(model_id: str) -> Dict[str, Any]:
 def get_recent_predictions_with_outcomes(days: int = 30) -> pd.DataFrame:
     """Get recent predictions with actual outcomes for evaluation."""
     try:
-        conn = sqlite3.connect(OFFLINE_DB_PATH)
-        
         # Calculate cutoff date
         cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
         
@@ -158,16 +327,15 @@ def get_recent_predictions_with_outcomes(days: int = 30) -> pd.DataFrame:
         LIMIT 100
         """
         
-        df = pd.read_sql_query(query, conn, params=(cutoff_date,))
-        conn.close()
+        # At most 100 rows: build the frame from the raw tuples rather than through read_sql_query
+        with _get_pool().read() as conn:
+            cursor = conn.execute(query, (cutoff_date,))
+            df = pd.DataFrame.from_records(cursor.fetchall(), columns=[d[0] for d in cursor.description])
         
         if df.empty:
             logger.warning("No recent prediction outcomes found")
             return pd.DataFrame()
         
-        # Parse InputFeatures JSON
-        df['InputFeatures'] = df['InputFeatures'].apply(lambda x: json.loads(x) if x else {})
-        
         logger.info(f"Found {len(df)} recent prediction outcomes")
         return df
     except Exception as e:
@@ -185,29 +353,54 @@ def evaluate_model_performance(predictions_df: pd.DataFrame) -> Dict[str, Any]:
         if 'ErrorDays' not in predictions_df.columns:
             predictions_df['ErrorDays'] = predictions_df['PredictedTransitionDays'] - predictions_df['ActualTransitionDays']
         
-        predictions_df['AbsErrorDays'] = predictions_df['ErrorDays'].abs()
+        # Materialize the columns once; missing values are skipped as pandas would
+        abs_err = np.abs(predictions_df['ErrorDays'].to_numpy(dtype=np.float64))
+        conf = predictions_df['ConfidenceScore'].to_numpy(dtype=np.float64)
+        
+        # One sort serves the error means and all three accuracy thresholds (NaNs sort last)
+        sorted_err = np.sort(abs_err)
+        known_err = sorted_err[:np.count_nonzero(~np.isnan(sorted_err))]
+        within_3, within_7, within_14 = np.searchsorted(sorted_err, [3, 7, 14], side='right') / len(sorted_err)
+        
+        # Pearson correlation over rows with both values, NaN if it is undefined. A constant
+        # column is checked explicitly: corrcoef can return rounding noise instead of NaN for it
+        paired = ~np.isnan(conf) & ~np.isnan(abs_err)
+        paired_conf, paired_err = conf[paired], abs_err[paired]
+        if len(paired_conf) > 1 and np.ptp(paired_conf) > 0 and np.ptp(paired_err) > 0:
+            correlation = np.corrcoef(paired_conf, paired_err)[0, 1]
+        else:
+            correlation = np.nan
         
         # Calculate performance metrics
         metrics = {
             'sample_size': len(predictions_df),
-            'mae': predictions_df['AbsErrorDays'].mean(),
-            'rmse': np.sqrt((predictions_df['ErrorDays'] ** 2).mean()),
-            'accuracy_within_3_days': (predictions_df['AbsErrorDays'] <= 3).mean(),
-            'accuracy_within_7_days': (predictions_df['AbsErrorDays'] <= 7).mean(),
-            'accuracy_within_14_days': (predictions_df['AbsErrorDays'] <= 14).mean(),
-            'mean_confidence_score': predictions_df['ConfidenceScore'].mean(),
-            'confidence_score_correlation': predictions_df[['ConfidenceScore', 'AbsErrorDays']].corr().iloc[0, 1] * -1,
+            'mae': known_err.mean() if len(known_err) else np.nan,
+            'rmse': np.sqrt((known_err ** 2).mean()) if len(known_err) else np.nan,
+            'accuracy_within_3_days': within_3,
+            'accuracy_within_7_days': within_7,
+            'accuracy_within_14_days': within_14,
+            'mean_confidence_score': np.nanmean(conf) if (~np.isnan(conf)).any() else np.nan,
+            'confidence_score_correlation': correlation * -1,
             'evaluation_date': datetime.now().isoformat()
         }
         
-        # Calculate metrics by model version
-        metrics_by_version = {}
-        for version, group in predictions_df.groupby('ModelVersion'):
-            metrics_by_version[version] = {
-                'sample_size': len(group),
-                'mae': group['AbsErrorDays'].mean(),
-                'accuracy_within_7_days': (group['AbsErrorDays'] <= 7).mean()
+        # Calculate metrics by model version with per-version sums over the factorized codes
+        codes, versions = pd.factorize(predictions_df['ModelVersion'], sort=True)
+        has_version = codes >= 0
+        codes, version_err = codes[has_version], abs_err[has_version]
+        known = ~np.isnan(version_err)
+        counts = np.bincount(codes, minlength=len(versions))
+        known_counts = np.bincount(codes[known], minlength=len(versions))
+        err_sums = np.bincount(codes[known], weights=version_err[known], minlength=len(versions))
+        within_7_counts = np.bincount(codes, weights=version_err <= 7, minlength=len(versions))
+        metrics_by_version = {
+            version: {
+                'sample_size': int(counts[i]),
+                'mae': err_sums[i] / known_counts[i] if known_counts[i] else np.nan,
+                'accuracy_within_7_days': within_7_counts[i] / counts[i]
             }
+            for i, version in enumerate(versions.tolist())
+        }
         
         metrics['metrics_by_version'] = metrics_by_version
         
@@ -217,52 +410,86 @@ def evaluate_model_performance(predictions_df: pd.DataFrame) -> Dict[str, Any]:
         logger.error(f"Error evaluating model performance: {str(e)}")
         return {}
 
-def get_training_data_sample() -> pd.DataFrame:
-    """Get a sample of the training data for drift detection."""
-    try:
-        conn = sqlite3.connect(OFFLINE_DB_PATH)
-        
-        query = """
-        SELECT
-            FilingType, TaxYear, ClaimedRefundAmount, GeographicRegion,
-            ProcessingCenter, FilingPeriod
-        FROM
-            TrainingData
-        WHERE
-            DataPartition = 'training'
-        ORDER BY
-            RANDOM()
-        LIMIT 1000
-        """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+def _draw_training_sample() -> pd.DataFrame:
+    """Draw a random sample of TRAINING_SAMPLE_SIZE rows from the training partition."""
+    select = """
+    SELECT
+        FilingType, TaxYear, ClaimedRefundAmount, GeographicRegion,
+        ProcessingCenter, FilingPeriod
+    FROM
+        TrainingData
+    WHERE
+        DataPartition = 'training'
+    """
+    
+    with _get_pool().read() as conn:
+        # Probe random rowids instead of sorting the whole table by RANDOM()
+        max_rowid = conn.execute("SELECT MAX(rowid) FROM TrainingData").fetchone()[0] or 0
+        candidates = random.sample(range(1, max_rowid + 1), min(max_rowid, 4 * TRAINING_SAMPLE_SIZE))
+        df = pd.read_sql_query(
+            f"{select} AND rowid IN (SELECT value FROM json_each(?))", conn, params=(json.dumps(candidates),)
+        )
         
+        if len(df) >= TRAINING_SAMPLE_SIZE:
+            return df.sample(n=TRAINING_SAMPLE_SIZE).reset_index(drop=True)
+        if len(candidates) < max_rowid:
+            # Too few training rows among the probed rowids, so sample the full table
+            return pd.read_sql_query(f"{select} ORDER BY RANDOM() LIMIT ?", conn, params=(TRAINING_SAMPLE_SIZE,))
         return df
+
+def get_training_data_sample(model_id: Optional[str] = None) -> pd.DataFrame:
+    """Get a sample of the training data for drift detection."""
+    try:
+        # Reuse the sample drawn for this model until it is older than TRAINING_SAMPLE_TTL;
+        # a retrained model has a new ID and so gets a fresh sample
+        cache_key = (OFFLINE_DB_PATH, model_id)
+        if cache_key == _training_sample_cache["key"] and time.time() - _training_sample_cache["drawn_at"] < TRAINING_SAMPLE_TTL:
+            return _training_sample_cache["df"].copy()
+        
+        # The sample is also kept next to the model so a new process can skip the database
+        sample_path = os.path.join(MODEL_DIR, f'training_sample_{model_id}.joblib') if model_id else None
+        if sample_path and os.path.exists(sample_path) and time.time() - os.path.getmtime(sample_path) < TRAINING_SAMPLE_TTL:
+            df = joblib.load(sample_path)
+            drawn_at = os.path.getmtime(sample_path)
+        else:
+            df = _draw_training_sample()
+            drawn_at = time.time()
+            if sample_path:
+                try:
+                    # Write to a temporary file and rename, so readers never see a partial sample
+                    tmp_path = f"{sample_path}.tmp"
+                    joblib.dump(df, tmp_path)
+                    os.replace(tmp_path, sample_path)
+                except OSError as e:
+                    logger.warning(f"Could not save training data sample: {str(e)}")
+        
+        _training_sample_cache.update(key=cache_key, df=df, drawn_at=drawn_at)
+        return df.copy()
     except Exception as e:
         logger.error(f"Error getting training data sample: {str(e)}")
         return pd.DataFrame()
 
+def _parse_input_features(value: Any) -> Any:
+    """Parse a stored InputFeatures value; missing or empty values become an empty dict."""
+    if value is None or value == '':
+        return {}
+    return json.loads(value) if isinstance(value, str) else value
+
 def extract_features_from_predictions(predictions_df: pd.DataFrame) -> pd.DataFrame:
     """Extract features from prediction input features for drift detection."""
     if predictions_df.empty:
         return pd.DataFrame()
     
     try:
-        # Extract features from InputFeatures JSON
-        features = []
-        for _, row in predictions_df.iterrows():
-            input_features = row['InputFeatures']
-            if isinstance(input_features, dict):
-                # Extract first value from each feature (since they're lists)
-                feature_dict = {k: v[0] if isinstance(v, list) and len(v) > 0 else v 
-                               for k, v in input_features.items()}
-                features.append(feature_dict)
+        # Parse InputFeatures JSON here, where it is used, one column per top-level key
+        parsed = (_parse_input_features(f) for f in predictions_df['InputFeatures'])
+        features = [f for f in parsed if isinstance(f, dict)]
         
         if not features:
             return pd.DataFrame()
         
         # Convert to DataFrame
-        features_df = pd.DataFrame(features)
+        features_df = pd.json_normalize(features, max_level=0)
         
         # Select only common features for drift detection
         common_features = ['FilingType', 'TaxYear', 'GeographicRegion', 
@@ -274,11 +501,47 @@ def extract_features_from_predictions(predictions_df: pd.DataFrame) -> pd.DataFr
         if not common_features:
             return pd.DataFrame()
         
-        return features_df[common_features]
+        # Extract first value from each feature (since they're lists)
+        return features_df[common_features].map(lambda v: v[0] if isinstance(v, list) and len(v) > 0 else v)
     except Exception as e:
         logger.error(f"Error extracting features from predictions: {str(e)}")
         return pd.DataFrame()
 
+def ks_2samp_batch(training: np.ndarray, recent: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Two-sample Kolmogorov-Smirnov statistics and asymptotic p-values for each column.
+    
+    NaNs are ignored per column. Both samples are sorted together once and the gap
+    between the two empirical CDFs is read off a running sum, so every column is
+    tested in the same vectorized pass.
+    """
+    training = np.asarray(training, dtype=np.float64)
+    recent = np.asarray(recent, dtype=np.float64)
+    n_training = np.count_nonzero(~np.isnan(training), axis=0)
+    n_recent = np.count_nonzero(~np.isnan(recent), axis=0)
+    if (n_training == 0).any() or (n_recent == 0).any():
+        raise ValueError("Data passed to ks_2samp_batch must not be empty")
+    
+    # Each training value steps the CDF gap up by 1/n, each recent value down by 1/m
+    values = np.concatenate([training, recent])
+    steps = np.concatenate([
+        np.where(np.isnan(training), 0.0, 1.0 / n_training),
+        np.where(np.isnan(recent), 0.0, -1.0 / n_recent)
+    ])
+    order = np.argsort(values, axis=0, kind='stable')  # NaNs sort last
+    values = np.take_along_axis(values, order, axis=0)
+    cdf_gap = np.cumsum(np.take_along_axis(steps, order, axis=0), axis=0)
+    
+    # Only the last of a run of tied values is a point where both CDFs are defined
+    at_step = np.ones(values.shape, dtype=bool)
+    at_step[:-1] = values[:-1] != values[1:]
+    at_step &= ~np.isnan(values)
+    statistics = np.where(at_step, np.abs(cdf_gap), 0.0).max(axis=0)
+    
+    # Smirnov's asymptotic distribution with the effective sample size, as ks_2samp(method='asymp')
+    effective_n = np.round(n_training * n_recent / (n_training + n_recent))
+    p_values = np.clip(kstwo.sf(statistics, effective_n), 0, 1)
+    return statistics, p_values
+
 def detect_feature_drift(training_df: pd.DataFrame, recent_df: pd.DataFrame) -> Dict[str, Any]:
     """Detect drift in feature distributions between training and recent data."""
     if training_df.empty or recent_df.empty:
@@ -307,10 +570,21 @@ def detect_feature_drift(training_df: pd.DataFrame, recent_df: pd.DataFrame) ->
         drift_scores = {}
         significant_features = []
         
+        # For numeric features, use Kolmogorov-Smirnov test, all columns in one call
+        numeric_cols = [
+            col for col in common_cols
+            if pd.api.types.is_numeric_dtype(training_df[col]) and pd.api.types.is_numeric_dtype(recent_df[col])
+        ]
+        if numeric_cols:
+            ks_stats, p_values = ks_2samp_batch(
+                training_df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan),
+                recent_df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+            )
+            numeric_results = dict(zip(numeric_cols, zip(ks_stats.tolist(), p_values.tolist())))
+        
         for col in common_cols:
-            if pd.api.types.is_numeric_dtype(training_df[col]) and pd.api.types.is_numeric_dtype(recent_df[col]):
-                # For numeric features, use Kolmogorov-Smirnov test
-                ks_stat, p_value = ks_2samp(training_df[col].dropna(), recent_df[col].dropna())
+            if col in numeric_cols:
+                ks_stat, p_value = numeric_results[col]
                 drift_scores[col] = ks_stat
                 
                 # If p-value is small, drift is significant
@@ -318,18 +592,16 @@ def detect_feature_drift(training_df: pd.DataFrame, recent_df: pd.DataFrame) ->
                     significant_features.append(col)
             else:
                 # For categorical features, compare distribution
-                train_dist = training_df[col].value_counts(normalize=True).to_dict()
-                recent_dist = recent_df[col].value_counts(normalize=True).to_dict()
-                
-                # Calculate Jensen-Shannon divergence (simplified)
-                categories = set(train_dist.keys()) | set(recent_dist.keys())
-                js_div = 0.0
+                train_dist, recent_dist = training_df[col].value_counts(normalize=True).align(
+                    recent_df[col].value_counts(normalize=True), fill_value=0.0
+                )
                 
-                for cat in categories:
-                    p = train_dist.get(cat, 0)
-                    q = recent_dist.get(cat, 0)
-                    if p > 0 and q > 0:
-                        js_div += 0.5 * (p * np.log(p/q) + q * np.log(q/p))
+                # Calculate Jensen-Shannon divergence (simplified), over categories seen in both
+                p = train_dist.to_numpy(dtype=np.float64)
+                q = recent_dist.to_numpy(dtype=np.float64)
+                shared = (p > 0) & (q > 0)
+                p, q = p[shared], q[shared]
+                js_div = float(0.5 * (p * np.log(p / q) + q * np.log(q / p)).sum())
                 
                 drift_scores[col] = min(1.0, js_div)
                 
@@ -442,95 +714,84 @@ def store_monitoring_results(
 ) -> bool:
     """Store monitoring results in the database."""
     try:
-        conn = sqlite3.connect(OFFLINE_DB_PATH)
-        cursor = conn.cursor()
+        # One timestamp for every row this run stores, and the drift windows relative to it
+        now = datetime.now()
+        now_iso = now.isoformat()
+        baseline_start = (now - timedelta(days=90)).isoformat()
+        current_start = (now - timedelta(days=30)).isoformat()
         
         # Check if tables exist
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ModelPerformance'")
-        has_performance_table = cursor.fetchone() is not None
-        
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='FeatureDrift'")
-        has_drift_table = cursor.fetchone() is not None
-        
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='RetrainingDecisions'")
-        has_decisions_table = cursor.fetchone() is not None
-        
-        # Store performance metrics
-        performance_id = None
-        if has_performance_table and performance_metrics:
-            performance_id = f"perf-{uuid.uuid4()}"
-            cursor.execute('''
-            INSERT INTO ModelPerformance (
-                PerformanceID, ModelID, EvaluationDate, DataPartition,
-                EvaluationPeriod, SampleSize, MeanAbsoluteErrorDays,
-                AccuracyWithin7Days, ConfidenceScoreCorrelation
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                performance_id,
-                model_id,
-                performance_metrics.get('evaluation_date', datetime.now().isoformat()),
-                'production',
-                f"Recent {performance_metrics.get('sample_size', 0)} predictions",
-                performance_metrics.get('sample_size', 0),
-                performance_metrics.get('mae', 0.0),
-                performance_metrics.get('accuracy_within_7_days', 0.0),
-                performance_metrics.get('confidence_score_correlation', 0.0)
-            ))
-            logger.info(f"Stored performance metrics with ID {performance_id}")
-        
-        # Store drift results
-        drift_id = None
-        if has_drift_table and drift_results:
-            drift_id = f"drift-{uuid.uuid4()}"
-            cursor.execute('''
-            INSERT INTO FeatureDrift (
-                DriftID, ModelID, DetectionDate, FeatureDriftScore,
-                DriftDetected, SignificantFeatures, SampleSize,
-                BaselineStartDate, BaselineEndDate, CurrentStartDate, CurrentEndDate
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                drift_id,
-                model_id,
-                drift_results.get('detection_date', datetime.now().isoformat()),
-                drift_results.get('drift_score', 0.0),
-                1 if drift_results.get('drift_detected', False) else 0,
-                json.dumps(drift_results.get('significant_features', [])),
-                drift_results.get('sample_size', 0),
-                (datetime.now() - timedelta(days=90)).isoformat(),
-                (datetime.now() - timedelta(days=30)).isoformat(),
-                (datetime.now() - timedelta(days=30)).isoformat(),
-                datetime.now().isoformat()
-            ))
-            logger.info(f"Stored drift results with ID {drift_id}")
-        
-        # Store retraining recommendation
+        tables = _existing_tables(OFFLINE_DB_PATH, _db_mtime_key(OFFLINE_DB_PATH))
+        has_performance_table = 'ModelPerformance' in tables
+        has_drift_table = 'FeatureDrift' in tables
+        has_decisions_table = 'RetrainingDecisions' in tables
+        
+        # Older databases may predate the DecisionEpoch column written below
         if has_decisions_table and recommendation:
-            decision_id = f"decision-{uuid.uuid4()}"
-            cursor.execute('''
-            INSERT INTO RetrainingDecisions (
-                DecisionID, ModelID, DecisionDate, ScheduleBasedRetraining,
-                PerformanceBasedRetraining, DriftBasedRetraining,
-                RetrainingRecommended, RecommendationReason, LastTrainingDate,
-                PerformanceMetricID, DriftMetricID, DecisionMadeBy
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                decision_id,
-                model_id,
-                recommendation.get('decision_date', datetime.now().isoformat()),
-                1 if recommendation.get('schedule_based_retraining', False) else 0,
-                1 if recommendation.get('performance_based_retraining', False) else 0,
-                1 if recommendation.get('drift_based_retraining', False) else 0,
-                1 if recommendation.get('retraining_recommended', False) else 0,
-                recommendation.get('recommendation_reason', ''),
-                datetime.now().isoformat(),  # Placeholder for last training date
-                performance_id,
-                drift_id,
-                'model_monitoring'
-            ))
-            logger.info(f"Stored retraining recommendation with ID {decision_id}")
-        
-        conn.commit()
-        conn.close()
+            with _get_pool().write() as conn:
+                migrate_offline_db(conn)
+        
+        # The writer commits all three rows together, or rolls them back on error
+        with _get_pool().write() as conn:
+            cursor = conn.cursor()
+            
+            # Store performance metrics
+            performance_id = None
+            if has_performance_table and performance_metrics:
+                performance_id = f"perf-{uuid.uuid4()}"
+                cursor.execute(MODEL_PERFORMANCE_INSERT, (
+                    performance_id,
+                    model_id,
+                    performance_metrics.get('evaluation_date', now_iso),
+                    'production',
+                    f"Recent {performance_metrics.get('sample_size', 0)} predictions",
+                    performance_metrics.get('sample_size', 0),
+                    performance_metrics.get('mae', 0.0),
+                    performance_metrics.get('accuracy_within_7_days', 0.0),
+                    performance_metrics.get('confidence_score_correlation', 0.0)
+                ))
+                logger.info(f"Stored performance metrics with ID {performance_id}")
+            
+            # Store drift results
+            drift_id = None
+            if has_drift_table and drift_results:
+                drift_id = f"drift-{uuid.uuid4()}"
+                cursor.execute(FEATURE_DRIFT_INSERT, (
+                    drift_id,
+                    model_id,
+                    drift_results.get('detection_date', now_iso),
+                    drift_results.get('drift_score', 0.0),
+                    1 if drift_results.get('drift_detected', False) else 0,
+                    json.dumps(drift_results.get('significant_features', [])),
+                    drift_results.get('sample_size', 0),
+                    baseline_start,
+                    current_start,
+                    current_start,
+                    now_iso
+                ))
+                logger.info(f"Stored drift results with ID {drift_id}")
+            
+            # Store retraining recommendation
+            if has_decisions_table and recommendation:
+                decision_id = f"decision-{uuid.uuid4()}"
+                decision_date = recommendation.get('decision_date', now_iso)
+                cursor.execute(RETRAINING_DECISION_INSERT, (
+                    decision_id,
+                    model_id,
+                    decision_date,
+                    1 if recommendation.get('schedule_based_retraining', False) else 0,
+                    1 if recommendation.get('performance_based_retraining', False) else 0,
+                    1 if recommendation.get('drift_based_retraining', False) else 0,
+                    1 if recommendation.get('retraining_recommended', False) else 0,
+                    recommendation.get('recommendation_reason', ''),
+                    now_iso,  # Placeholder for last training date
+                    performance_id,
+                    drift_id,
+                    'model_monitoring',
+                    int(datetime.fromisoformat(decision_date).timestamp())
+                ))
+                logger.info(f"Stored retraining recommendation with ID {decision_id}")
+        
         return True
     except Exception as e:
         logger.error(f"Error storing monitoring results: {str(e)}")
@@ -559,7 +820,7 @@ def run_model_monitoring() -> bool:
         performance_metrics = evaluate_model_performance(predictions_df)
         
         # Get training data sample
-        training_df = get_training_data_sample()
+        training_df = get_training_data_sample(model_id)
         
         # Extract features from recent predictions
         recent_features_df = extract_features_from_predictions(predictions_df)
@@ -8,21 +8,61 @@ performance metrics, and retraining decisions.
 """
 
 import os
+import sys
+import re
 import json
 import logging
 import sqlite3
 import joblib
+from joblib import Memory, parallel_backend
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple, Any, Optional
+
+# Shared offline database helpers live in src/, one level above this script
+_SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if _SRC_DIR not in sys.path:
+    sys.path.insert(0, _SRC_DIR)
+from offline_db import migrate_offline_db
+
+# Route scikit-learn estimators to Intel oneDAL's vectorized kernels when the
+# scikit-learn-intelex extension is installed; this must run before sklearn imports
+try:
+    from sklearnex import patch_sklearn
+    patch_sklearn(verbose=False)
+    SKLEARNEX_ENABLED = True
+except ImportError:
+    SKLEARNEX_ENABLED = False
+
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import OrdinalEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingRandomSearchCV)
+from sklearn.model_selection import train_test_split, HalvingRandomSearchCV
+from scipy.stats import randint
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+# connectorx reads query results straight into columnar buffers when installed
+try:
+    import connectorx as cx
+except ImportError:
+    cx = None
+
+# orjson serializes the metadata (including NumPy scalars) in C when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# treelite compiles the fitted forest to a native shared library when installed
+try:
+    import treelite
+    import treelite.sklearn
+except ImportError:
+    treelite = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,19 +75,32 @@ logger = logging.getLogger(__name__)
 OFFLINE_DB_PATH = os.environ.get('OFFLINE_DB_PATH', os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../ml_etl/data/processed/tax_refund_analytics.db')))
 MODEL_DIR = os.environ.get('MODEL_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../ml_etl/models')))
 
+# Compression for the versioned model archives: LZ4 when the lz4 package is installed, else zlib
+try:
+    import lz4.frame  # noqa: F401
+    MODEL_COMPRESSION = ('lz4', 3)
+except ImportError:
+    MODEL_COMPRESSION = ('zlib', 3)
+
+# Hyperparameter search budget: candidates sampled, and rows each candidate is first screened on
+SEARCH_CANDIDATES = 12
+SEARCH_MIN_RESOURCES = 300
+
+# Cache of fitted pipeline steps, shared by the hyperparameter search fits of one training run
+PIPELINE_CACHE_DIR = os.path.join(MODEL_DIR, '.sk_cache')
+
 # Get current version number
+# Versioned model file names, e.g. refund_prediction_model_v12.joblib
+MODEL_FILE_PATTERN = re.compile(r'refund_prediction_model_v(\d+)\.joblib')
+
 def get_next_version():
     """Get the next version number based on existing model files"""
-    version = 1
     # Check for existing model files
-    if os.path.exists(MODEL_DIR):
-        model_files = [f for f in os.listdir(MODEL_DIR) if f.startswith('refund_prediction_model_v') and f.endswith('.joblib')]
-        if model_files:
-            # Extract version numbers
-            versions = [int(f.split('_v')[1].split('.')[0]) for f in model_files]
-            if versions:
-                version = max(versions) + 1
-    return version
+    if not os.path.isdir(MODEL_DIR):
+        return 1
+    with os.scandir(MODEL_DIR) as entries:
+        versions = [int(match.group(1)) for entry in entries if (match := MODEL_FILE_PATTERN.fullmatch(entry.name))]
+    return max(versions, default=0) + 1
 
 # Generate versioned model paths
 VERSION = get_next_version()
@@ -61,42 +114,23 @@ os.makedirs(MODEL_DIR, exist_ok=True)
 print(f"Offline DB path: {OFFLINE_DB_PATH}")
 print(f"Model directory: {MODEL_DIR}")
 
-# SQL queries
-TRAINING_DATA_QUERY = """
-SELECT 
-    FilingType,
-    TaxYear,
-    ClaimedRefundAmount,
-    GeographicRegion,
-    ProcessingCenter,
-    FilingPeriod,
-    SourceStatus,
-    TargetStatus,
-    ActualTransitionDays
-FROM 
-    TrainingData
-WHERE
-    DataPartition = 'training'
-"""
+# Refund amount buckets, right-closed like the ETL's RefundAmountBucket CASE; amounts <= 0 get no bucket
+REFUND_BUCKET_EDGES = np.array([1000, 3000, 5000], dtype=np.float64)
+REFUND_BUCKET_LABELS = np.array(['0-1000', '1000-3000', '3000-5000', '5000+'], dtype=object)
 
-VALIDATION_DATA_QUERY = """
-SELECT 
-    FilingType,
-    TaxYear,
-    ClaimedRefundAmount,
-    GeographicRegion,
-    ProcessingCenter,
-    FilingPeriod,
-    SourceStatus,
-    TargetStatus,
-    ActualTransitionDays
-FROM 
-    TrainingData
-WHERE
-    DataPartition = 'validation'
-"""
+# String columns converted to category dtype on load, so comparisons run on integer codes
+CATEGORY_COLUMNS = ('SourceStatus', 'TargetStatus', 'FilingType', 'GeographicRegion', 'ProcessingCenter', 'FilingPeriod')
+
+# Numeric columns narrowed on load to halve the bytes moved through preprocessing and the search
+INTEGER_COLUMNS = ('TaxYear', 'SampleSize')
+FLOAT32_COLUMNS = ('SuccessRate', 'ClaimedRefundAmount', 'ActualTransitionDays', 'MedianTransitionDays')
+
+# Data partitions, in the order training, validation, test
+DATA_PARTITIONS = ('training', 'validation', 'test')
 
-TEST_DATA_QUERY = """
+# SQL queries
+# All partitions are read in one scan and split in pandas
+TRAINING_DATA_QUERY = """
 SELECT 
     FilingType,
     TaxYear,
@@ -106,11 +140,12 @@ SELECT
     FilingPeriod,
     SourceStatus,
     TargetStatus,
-    ActualTransitionDays
+    ActualTransitionDays,
+    DataPartition
 FROM 
     TrainingData
 WHERE
-    DataPartition = 'test'
+    DataPartition IN ('training', 'validation', 'test')
 """
 
 
@@ -121,9 +156,27 @@ def load_training_data() -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     conn = sqlite3.connect(OFFLINE_DB_PATH)
     
     try:
-        training_df = pd.read_sql_query(TRAINING_DATA_QUERY, conn)
-        validation_df = pd.read_sql_query(VALIDATION_DATA_QUERY, conn)
-        test_df = pd.read_sql_query(TEST_DATA_QUERY, conn)
+        # Memory-map the database file so the scan reads pages without extra copies
+        conn.execute('PRAGMA mmap_size = 268435456')
+        
+        # Load all partitions at once and split them by DataPartition
+        if cx is not None:
+            df = cx.read_sql(f"sqlite://{OFFLINE_DB_PATH}", TRAINING_DATA_QUERY, return_type='pandas')
+        else:
+            df = pd.read_sql_query(TRAINING_DATA_QUERY, conn)
+        for col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype('category')
+        for col in INTEGER_COLUMNS:
+            if col in df:
+                df[col] = pd.to_numeric(df[col], downcast='integer')
+        for col in FLOAT32_COLUMNS:
+            if col in df:
+                df[col] = df[col].astype(np.float32)
+        parts = {name: part.drop(columns='DataPartition').reset_index(drop=True) for name, part in df.groupby('DataPartition', sort=False)}
+        empty = df.drop(columns='DataPartition').iloc[0:0]
+        training_df = parts.get('training', empty)
+        validation_df = parts.get('validation', empty)
+        test_df = parts.get('test', empty)
         
         logger.info(f"Loaded {len(training_df)} training records, {len(validation_df)} validation records, and {len(test_df)} test records")
         
@@ -134,6 +187,15 @@ def load_training_data() -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
         conn.close()
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
+def _equals_mask(column: pd.Series, value: str) -> np.ndarray:
+    """Return a boolean mask of the rows equal to value, comparing category codes when possible."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories = column.cat.categories
+        if value not in categories:
+            return np.zeros(len(column), dtype=bool)
+        return column.cat.codes.to_numpy() == categories.get_loc(value)
+    return (column == value).to_numpy()
+
 def preprocess_data(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
     """Preprocess the data for model training."""
     logger.info("Preprocessing data for model training")
@@ -143,47 +205,54 @@ def preprocess_data(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
         return pd.DataFrame(), pd.Series()
     
     # Filter for specific transition (Processing -> Approved)
-    df_filtered = df[(df['SourceStatus'] == 'Processing') & (df['TargetStatus'] == 'Approved')].copy()
+    transition = _equals_mask(df['SourceStatus'], 'Processing') & _equals_mask(df['TargetStatus'], 'Approved')
     
-    if df_filtered.empty:
+    if not transition.any():
         logger.warning("No relevant transitions found in data. Using all transitions instead.")
         # Use all transitions as a fallback
-        df_filtered = df.copy()
-        
-        if df_filtered.empty:
-            logger.warning("No transitions found in data at all")
-            return pd.DataFrame(), pd.Series()
+        transition = np.ones(len(df), dtype=bool)
     
-    # Create refund amount buckets if not already present
-    if 'RefundAmountBucket' not in df_filtered.columns:
-        df_filtered['RefundAmountBucket'] = pd.cut(
-            df_filtered['ClaimedRefundAmount'],
-            bins=[0, 1000, 3000, 5000, float('inf')],
-            labels=['0-1000', '1000-3000', '3000-5000', '5000+']
-        )
+    # Rows without a target value are dropped in the same selection
+    has_target = df['ActualTransitionDays'].notna().to_numpy()
+    missing_targets = np.count_nonzero(transition & ~has_target)
+    if missing_targets:
+        logger.warning(f"Found {missing_targets} NaN values in target variable. Dropping these rows.")
     
-    # Features and target
-    X = df_filtered.drop(['SourceStatus', 'TargetStatus', 'ActualTransitionDays'], axis=1)
+    rows = np.flatnonzero(transition & has_target)
+    if len(rows) == 0:
+        logger.warning("No valid target values remain after dropping NaN values")
+        return pd.DataFrame(), pd.Series()
     
-    # Handle NaN values in the target variable
-    y = df_filtered['ActualTransitionDays']
+    # Features and target, taken from the selected rows with a single copy
+    feature_columns = [col for col in df.columns if col not in ('SourceStatus', 'TargetStatus', 'ActualTransitionDays')]
+    X = df.iloc[rows, df.columns.get_indexer(feature_columns)]
+    X.index = pd.RangeIndex(len(rows))
+    y = pd.Series(df['ActualTransitionDays'].to_numpy(dtype=np.float32)[rows], name='ActualTransitionDays')
     
-    # Check for NaN values
-    if y.isna().any():
-        logger.warning(f"Found {y.isna().sum()} NaN values in target variable. Dropping these rows.")
-        # Get indices of non-NaN values
-        valid_indices = ~y.isna()
-        X = X[valid_indices]
-        y = y[valid_indices]
-        
-        if len(y) == 0:
-            logger.warning("No valid target values remain after dropping NaN values")
-            return pd.DataFrame(), pd.Series()
+    # Create refund amount buckets if not already present
+    if 'RefundAmountBucket' not in X.columns:
+        # Look up the bucket index of every amount at once and use it as the category code
+        amounts = X['ClaimedRefundAmount'].to_numpy(dtype=np.float64)
+        codes = np.searchsorted(REFUND_BUCKET_EDGES, amounts, side='left')
+        codes[~(amounts > 0)] = -1
+        X['RefundAmountBucket'] = pd.Categorical.from_codes(codes, categories=REFUND_BUCKET_LABELS)
     
     logger.info(f"Preprocessed data: {X.shape[0]} samples, {X.shape[1]} features")
     return X, y
 
-def build_model_pipeline(X: pd.DataFrame) -> Pipeline:
+def split_partitions(X: pd.DataFrame, y: pd.Series) -> List[Tuple[pd.DataFrame, pd.Series]]:
+    """Split preprocessed data on its DataPartition column into training, validation, and test sets."""
+    if X.empty:
+        return [(pd.DataFrame(), pd.Series()) for _ in DATA_PARTITIONS]
+    
+    partition = X.pop('DataPartition').to_numpy()
+    splits = []
+    for name in DATA_PARTITIONS:
+        rows = np.flatnonzero(partition == name)
+        splits.append((X.iloc[rows].reset_index(drop=True), y.iloc[rows].reset_index(drop=True)))
+    return splits
+
+def build_model_pipeline(X: pd.DataFrame, memory: Optional[Memory] = None) -> Pipeline:
     """Build the ML model pipeline."""
     logger.info("Building model pipeline")
     
@@ -200,28 +269,32 @@ def build_model_pipeline(X: pd.DataFrame) -> Pipeline:
     logger.info(f"Categorical features: {categorical_features}")
     logger.info(f"Numerical features: {numerical_features}")
     
-    # Define preprocessing for categorical features
-    categorical_transformer = Pipeline(steps=[
-        ('onehot', OneHotEncoder(handle_unknown='ignore'))
-    ])
+    # Category lists are fixed up front from the category dtypes set on load, so fitting
+    # the encoder does not rediscover them with np.unique on every search fit
+    if all(isinstance(X[col].dtype, pd.CategoricalDtype) for col in categorical_features):
+        categories = [X[col].cat.categories.tolist() for col in categorical_features]
+    else:
+        categories = 'auto'
     
-    # Define preprocessing for numerical features
-    numerical_transformer = Pipeline(steps=[
-        ('scaler', StandardScaler())
+    # Define preprocessing for categorical features; the trees split on the integer
+    # codes directly, so each category column stays one column instead of k one-hot columns.
+    # Unknown and missing categories encode as -1
+    categorical_transformer = Pipeline(steps=[
+        ('ordinal', OrdinalEncoder(categories=categories, handle_unknown='use_encoded_value', unknown_value=-1))
     ])
     
-    # Combine preprocessing steps
+    # Combine preprocessing steps; numerical features need no scaling for a tree ensemble
     preprocessor = ColumnTransformer(
         transformers=[
             ('cat', categorical_transformer, categorical_features),
-            ('num', numerical_transformer, numerical_features)
+            ('num', 'passthrough', numerical_features)
         ])
     
     # Create the model pipeline
     model_pipeline = Pipeline(steps=[
         ('preprocessor', preprocessor),
-        ('regressor', RandomForestRegressor(random_state=42))
-    ])
+        ('regressor', RandomForestRegressor(random_state=42, n_jobs=1))
+    ], memory=memory)
     
     return model_pipeline
 
@@ -233,29 +306,46 @@ def train_model(X_train: pd.DataFrame, y_train: pd.Series, X_val: pd.DataFrame,
         logger.warning("No data for training")
         return None, {}
     
-    # Build model pipeline
-    model_pipeline = build_model_pipeline(X_train)
+    # Build model pipeline; the search only varies regressor parameters, so the fitted
+    # preprocessor is cached and reused by every candidate trained on the same fold
+    pipeline_memory = Memory(PIPELINE_CACHE_DIR, verbose=0)
+    model_pipeline = build_model_pipeline(X_train, memory=pipeline_memory)
     
-    # Define hyperparameter grid
-    param_grid = {
-        'regressor__n_estimators': [50, 100],
+    # Define hyperparameter distributions
+    param_distributions = {
+        'regressor__n_estimators': randint(50, 200),
         'regressor__max_depth': [None, 10, 20],
-        'regressor__min_samples_split': [2, 5]
+        'regressor__min_samples_split': [2, 5],
+        # Bootstrap half the rows per tree: smaller trees, faster to fit, load and predict
+        'regressor__max_samples': [0.5, None]
     }
     
-    # Perform grid search
-    grid_search = GridSearchCV(
-        model_pipeline, 
-        param_grid, 
-        cv=3, 
+    # Perform successive-halving search: a fixed number of candidates is screened on
+    # subsamples of a few hundred rows and only the best few move on to larger ones.
+    # The budget is explicit; the 'exhaust' defaults would sample hundreds of candidates
+    grid_search = HalvingRandomSearchCV(
+        model_pipeline,
+        param_distributions,
+        n_candidates=SEARCH_CANDIDATES,
+        factor=3,
+        resource='n_samples',
+        min_resources=min(SEARCH_MIN_RESOURCES, len(X_train)),
+        cv=3,
         scoring='neg_mean_absolute_error',
+        random_state=42,
         n_jobs=-1
     )
     
-    # Train the model
-    grid_search.fit(X_train, y_train)
+    # Train the model; the search already runs one worker per core, so each worker
+    # fits its forest single-threaded and its BLAS/OpenMP pools are capped at one thread
+    with parallel_backend('loky', n_jobs=-1, inner_max_num_threads=1):
+        grid_search.fit(X_train, y_train)
     best_model = grid_search.best_estimator_
     
+    # The cache only helps within this search; detach it from the saved model and drop it
+    best_model.set_params(memory=None)
+    pipeline_memory.clear(warn=False)
+    
     # Evaluate the model on validation set
     y_val_pred = best_model.predict(X_val)
     
@@ -264,9 +354,12 @@ def train_model(X_train: pd.DataFrame, y_train: pd.Series, X_val: pd.DataFrame,
         'mae': mean_absolute_error(y_val, y_val_pred),
         'rmse': np.sqrt(mean_squared_error(y_val, y_val_pred)),
         'r2': r2_score(y_val, y_val_pred),
-        'best_params': grid_search.best_params_,
-        'accuracy_within_7_days': np.mean(np.abs(y_val - y_val_pred) <= 7),
-        'feature_importance': dict(zip(X_train.columns, best_model.named_steps['regressor'].feature_importances_))
+        'best_params': {k: v.item() if isinstance(v, np.generic) else v for k, v in grid_search.best_params_.items()},
+        'accuracy_within_7_days': float(np.mean(np.abs(y_val.to_numpy(dtype=np.float64) - y_val_pred) <= 7)),
+        'feature_importance': dict(zip(
+            [col for _, transformer, columns in best_model.named_steps['preprocessor'].transformers_ if transformer != 'drop' for col in columns],
+            best_model.named_steps['regressor'].feature_importances_
+        ))
     }
     
     logger.info(f"Model training completed. MAE: {metrics['mae']:.2f}, RMSE: {metrics['rmse']:.2f}, R²: {metrics['r2']:.2f}")
@@ -284,14 +377,17 @@ def evaluate_model(model: Pipeline, X_test: pd.DataFrame, y_test: pd.Series) ->
     # Make predictions
     y_pred = model.predict(X_test)
     
+    # Absolute errors, computed once for all accuracy thresholds
+    abs_error = np.abs(y_test.to_numpy(dtype=np.float64) - y_pred)
+    
     # Calculate metrics
     metrics = {
         'mae': mean_absolute_error(y_test, y_pred),
         'rmse': np.sqrt(mean_squared_error(y_test, y_pred)),
         'r2': r2_score(y_test, y_pred),
-        'accuracy_within_3_days': np.mean(np.abs(y_test - y_pred) <= 3),
-        'accuracy_within_7_days': np.mean(np.abs(y_test - y_pred) <= 7),
-        'accuracy_within_14_days': np.mean(np.abs(y_test - y_pred) <= 14)
+        'accuracy_within_3_days': float(np.mean(abs_error <= 3)),
+        'accuracy_within_7_days': float(np.mean(abs_error <= 7)),
+        'accuracy_within_14_days': float(np.mean(abs_error <= 14))
     }
     
     logger.info(f"Test set evaluation: MAE: {metrics['mae']:.2f}, RMSE: {metrics['rmse']:.2f}, R²: {metrics['r2']:.2f}")
@@ -301,6 +397,28 @@ def evaluate_model(model: Pipeline, X_test: pd.DataFrame, y_test: pd.Series) ->
     
     return metrics
 
+def export_compiled_model(model: Pipeline) -> Optional[str]:
+    """Compile the fitted forest to a shared library with treelite and return its path, or None."""
+    if treelite is None:
+        return None
+    
+    # Only the regressor is compiled; inputs must go through the pipeline's preprocessor first
+    lib_path = os.path.join(MODEL_DIR, f'refund_v{VERSION}.so')
+    try:
+        tl_model = treelite.sklearn.import_model(model.named_steps['regressor'])
+        if hasattr(tl_model, 'export_lib'):
+            tl_model.export_lib(toolchain='gcc', libpath=lib_path, params={'parallel_comp': 8})
+        else:
+            # treelite 4 moved code generation to the tl2cgen package
+            import tl2cgen
+            tl2cgen.export_lib(tl_model, toolchain='gcc', libpath=lib_path, params={'parallel_comp': 8})
+    except Exception as e:
+        logger.warning(f"Failed to compile model with treelite: {str(e)}")
+        return None
+    
+    logger.info(f"Compiled model v{VERSION} saved to {lib_path}")
+    return lib_path
+
 def save_model(model: Pipeline, train_metrics: Dict[str, Any], test_metrics: Dict[str, Any], X_train: pd.DataFrame) -> str:
     """Save the trained model, its metadata, and performance metrics."""
     logger.info("Saving model and metadata")
@@ -311,8 +429,8 @@ def save_model(model: Pipeline, train_metrics: Dict[str, Any], test_metrics: Dic
     # Generate model ID
     model_id = f"model-{VERSION}"
     
-    # Save the model
-    joblib.dump(model, MODEL_PATH)
+    # Save the model; versioned archives are compressed since they are kept but rarely loaded
+    joblib.dump(model, MODEL_PATH, compress=MODEL_COMPRESSION, protocol=5)
     
     # Save model metadata
     metadata = {
@@ -325,11 +443,18 @@ def save_model(model: Pipeline, train_metrics: Dict[str, Any], test_metrics: Dic
         'training_metrics': {k: v for k, v in train_metrics.items() if k not in ['best_params', 'feature_importance']},
         'test_metrics': test_metrics,
         'feature_importance': train_metrics.get('feature_importance', {}),
+        'compiled_model_path': export_compiled_model(model),
         'description': 'Tax refund processing time prediction model'
     }
     
-    with open(MODEL_METADATA_PATH, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    # Serialize once; the same bytes are written to the versioned and latest files
+    if orjson is not None:
+        metadata_bytes = orjson.dumps(metadata, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        metadata_bytes = json.dumps(metadata, indent=2).encode('utf-8')
+    
+    with open(MODEL_METADATA_PATH, 'wb') as f:
+        f.write(metadata_bytes)
     
     # Also save a copy as the latest model for easy reference
     latest_model_path = os.path.join(MODEL_DIR, 'refund_prediction_model_latest.joblib')
@@ -337,11 +462,15 @@ def save_model(model: Pipeline, train_metrics: Dict[str, Any], test_metrics: Dic
     
     try:
         # Copy the model file
-        joblib.dump(model, latest_model_path)
+        # Written uncompressed to a temporary file and swapped in, since the API
+        # memory-maps the latest model and must never see it truncated in place
+        tmp_model_path = f"{latest_model_path}.tmp"
+        joblib.dump(model, tmp_model_path, compress=0, protocol=5)
+        os.replace(tmp_model_path, latest_model_path)
         
         # Copy the metadata file
-        with open(latest_metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        with open(latest_metadata_path, 'wb') as f:
+            f.write(metadata_bytes)
         
         logger.info(f"Latest model saved to {latest_model_path}")
         logger.info(f"Latest model metadata saved to {latest_metadata_path}")
@@ -357,24 +486,28 @@ def record_model_in_db(model_id: str, metadata: Dict[str, Any]) -> None:
     """Record the model metadata in the database."""
     logger.info(f"Recording model {model_id} in database")
     
+    conn = None
     try:
         conn = sqlite3.connect(OFFLINE_DB_PATH)
+        # WAL with NORMAL sync: the commit appends to the log without a full fsync of the database
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
         cursor = conn.cursor()
         
         # Check if MLModels table exists
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='MLModels'")
         if cursor.fetchone() is None:
             logger.warning("MLModels table does not exist, skipping database recording")
-            conn.close()
             return
         
-        # Insert model metadata
-        cursor.execute('''
-        INSERT INTO MLModels (
-            ModelID, ModelVersion, Algorithm, Hyperparameters, FeatureList,
-            TrainingDataSize, TrainingStartDate, TrainingEndDate, CreatedBy, IsActive
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        # Older databases may predate the DecisionEpoch column written below
+        migrate_offline_db(conn)
+        
+        # Build all parameters up front so the transaction below only runs the statements
+        test_metrics = metadata.get('test_metrics', {})
+        performance_id = f"perf-{model_id}"
+        decision_id = f"decision-{model_id}"
+        model_params = (
             model_id,
             f"v{metadata['version']}",
             metadata['algorithm'],
@@ -385,43 +518,19 @@ def record_model_in_db(model_id: str, metadata: Dict[str, Any]) -> None:
             metadata['created_at'],
             'ml_pipeline',
             True
-        ))
-        
-        # Deactivate previous models
-        cursor.execute('''
-        UPDATE MLModels SET IsActive = 0 WHERE ModelID != ?
-        ''', (model_id,))
-        
-        # Insert performance metrics
-        performance_id = f"perf-{model_id}"
-        cursor.execute('''
-        INSERT INTO ModelPerformance (
-            PerformanceID, ModelID, EvaluationDate, DataPartition,
-            EvaluationPeriod, SampleSize, MeanAbsoluteErrorDays,
-            AccuracyWithin7Days, ConfidenceScoreCorrelation
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        )
+        performance_params = (
             performance_id,
             model_id,
             metadata['created_at'],
             'test',
             f"{datetime.now().date().isoformat()} evaluation",
-            metadata.get('test_metrics', {}).get('sample_size', 0),
-            metadata.get('test_metrics', {}).get('mae', 0),
-            metadata.get('test_metrics', {}).get('accuracy_within_7_days', 0),
-            metadata.get('test_metrics', {}).get('r2', 0)
-        ))
-        
-        # Insert retraining decision
-        decision_id = f"decision-{model_id}"
-        cursor.execute('''
-        INSERT INTO RetrainingDecisions (
-            DecisionID, ModelID, DecisionDate, ScheduleBasedRetraining,
-            PerformanceBasedRetraining, DriftBasedRetraining,
-            RetrainingRecommended, RecommendationReason, LastTrainingDate,
-            PerformanceMetricID, DecisionMadeBy
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+            test_metrics.get('sample_size', 0),
+            test_metrics.get('mae', 0),
+            test_metrics.get('accuracy_within_7_days', 0),
+            test_metrics.get('r2', 0)
+        )
+        decision_params = (
             decision_id,
             model_id,
             metadata['created_at'],
@@ -432,27 +541,67 @@ def record_model_in_db(model_id: str, metadata: Dict[str, Any]) -> None:
             'Initial training or scheduled retraining',
             metadata['created_at'],
             performance_id,
-            'ml_pipeline'
-        ))
+            'ml_pipeline',
+            int(datetime.fromisoformat(metadata['created_at']).timestamp())
+        )
+        
+        # Write everything in one transaction; it commits on success and rolls back on error
+        with conn:
+            # Insert model metadata
+            cursor.execute('''
+            INSERT INTO MLModels (
+                ModelID, ModelVersion, Algorithm, Hyperparameters, FeatureList,
+                TrainingDataSize, TrainingStartDate, TrainingEndDate, CreatedBy, IsActive
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', model_params)
+            
+            # Deactivate previous models, leaving already-inactive rows untouched
+            cursor.execute('''
+            UPDATE MLModels SET IsActive = 0 WHERE ModelID != ? AND IsActive != 0
+            ''', (model_id,))
+            
+            # Insert performance metrics
+            cursor.execute('''
+            INSERT INTO ModelPerformance (
+                PerformanceID, ModelID, EvaluationDate, DataPartition,
+                EvaluationPeriod, SampleSize, MeanAbsoluteErrorDays,
+                AccuracyWithin7Days, ConfidenceScoreCorrelation
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', performance_params)
+            
+            # Insert retraining decision
+            cursor.execute('''
+            INSERT INTO RetrainingDecisions (
+                DecisionID, ModelID, DecisionDate, ScheduleBasedRetraining,
+                PerformanceBasedRetraining, DriftBasedRetraining,
+                RetrainingRecommended, RecommendationReason, LastTrainingDate,
+                PerformanceMetricID, DecisionMadeBy, DecisionEpoch
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', decision_params)
         
-        conn.commit()
-        conn.close()
         logger.info(f"Model {model_id} recorded in database")
     except Exception as e:
         logger.error(f"Error recording model in database: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 def run_model_training() -> None:
     """Run the complete model training process."""
     logger.info("Starting model training process")
+    logger.info(f"Intel oneDAL acceleration (sklearnex): {'enabled' if SKLEARNEX_ENABLED else 'not available'}")
     
     try:
         # Load training data
         training_df, validation_df, test_df = load_training_data()
         
-        # Preprocess data
-        X_train, y_train = preprocess_data(training_df)
-        X_val, y_val = preprocess_data(validation_df)
-        X_test, y_test = preprocess_data(test_df)
+        # Preprocess all partitions in one pass, then split them again
+        combined_df = pd.concat(
+            [df.assign(DataPartition=name) for name, df in zip(DATA_PARTITIONS, (training_df, validation_df, test_df))],
+            ignore_index=True
+        )
+        X_all, y_all = preprocess_data(combined_df)
+        (X_train, y_train), (X_val, y_val), (X_test, y_test) = split_partitions(X_all, y_all)
         
         if X_train.empty or y_train.empty:
             logger.warning("No training data available")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Offline Database Migrations for Tax Refund Status Service
+
+Shared by the ETL, training, and monitoring scripts so that whichever of them
+touches an existing offline database first brings it up to date.
+"""
+
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+def migrate_offline_db(conn: sqlite3.Connection) -> None:
+    """Bring an existing offline database up to date with columns added since it was created."""
+    # RetrainingDecisions.DecisionEpoch: backfilled from DecisionDate, stored as local time
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(RetrainingDecisions)")}
+    if not columns:
+        return
+    if 'DecisionEpoch' not in columns:
+        logger.info("Adding DecisionEpoch to RetrainingDecisions")
+        conn.executescript("""
+        BEGIN;
+        ALTER TABLE RetrainingDecisions ADD COLUMN DecisionEpoch INTEGER;
+        UPDATE RetrainingDecisions
+        SET DecisionEpoch = CAST(strftime('%s', DecisionDate, 'utc') AS INTEGER);
+        COMMIT;
+        """)
+
+    # Latest-decision lookup used by the pipeline scheduler; also created for
+    # databases whose column was added before the index existed
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_retraining_decisions_epoch ON RetrainingDecisions(DecisionEpoch DESC)")
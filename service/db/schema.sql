@@ -49,4 +49,10 @@ CREATE TABLE IF NOT EXISTS TaxRefundPredictions (
     FOREIGN KEY (TaxFileID) REFERENCES TaxFiles(TaxFileID)
 );
 
+-- Index for the ETL self-join of consecutive status events
+CREATE INDEX IF NOT EXISTS idx_tpe_file_old ON TaxProcessingEvents(TaxFileID, OldStatus);
+
+-- Index for the ETL's first Processing/Approved event lookups per prediction
+CREATE INDEX IF NOT EXISTS idx_tpe_file_new_date ON TaxProcessingEvents(TaxFileID, NewStatus, StatusUpdateDate);
+
 -- End of schema
\ No newline at end of file